@@ -3,8 +3,9 @@ URLs for accounts app
 """
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
+    LoginView,
     UserRegistrationView,
     UserProfileView,
     ChangePasswordView,
@@ -16,7 +17,7 @@ router.register('addresses', UserAddressViewSet, basename='address')
 
 urlpatterns = [
     # Authentication
-    path('login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('login/', LoginView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('register/', UserRegistrationView.as_view(), name='register'),
     
@@ -5,8 +5,10 @@ from rest_framework import generics, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth import get_user_model
+from orders.cart_store import merge_anonymous_cart
 from .models import UserAddress
 from .serializers import (
     UserSerializer,
@@ -18,6 +20,20 @@ from .serializers import (
 User = get_user_model()
 
 
+class LoginView(TokenObtainPairView):
+    """JWT login that also merges the visitor's anonymous cart (X-Cart-Token)"""
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
+
+        merge_anonymous_cart(request, serializer.user)
+        return Response(serializer.validated_data, status=status.HTTP_200_OK)
+
+
 class UserRegistrationView(generics.CreateAPIView):
     """API endpoint for user registration"""
     queryset = User.objects.all()
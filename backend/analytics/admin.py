@@ -0,0 +1,21 @@
+"""
+Admin configuration for analytics app
+"""
+from django.contrib import admin
+from .models import SalesRollupRun
+
+
+@admin.register(SalesRollupRun)
+class SalesRollupRunAdmin(admin.ModelAdmin):
+    list_display = [
+        'created_at', 'is_full', 'days_updated', 'orders_scanned',
+        'duration', 'orders_until'
+    ]
+    list_filter = ['is_full']
+    readonly_fields = [
+        'orders_until', 'is_full', 'days_updated', 'orders_scanned',
+        'duration', 'created_at'
+    ]
+
+    def has_add_permission(self, request):
+        return False
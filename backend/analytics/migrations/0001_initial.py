@@ -0,0 +1,175 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("products", "0012_product_reserved_quantity"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SalesRollupRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "orders_until",
+                    models.DateTimeField(
+                        help_text="سفارش\u200cهای تغییر یافته تا این زمان در گزارش\u200cها لحاظ شده\u200cاند"
+                    ),
+                ),
+                ("is_full", models.BooleanField(default=False)),
+                ("days_updated", models.PositiveIntegerField(default=0)),
+                ("orders_scanned", models.PositiveIntegerField(default=0)),
+                ("duration", models.FloatField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "به\u200cروزرسانی گزارش فروش",
+                "verbose_name_plural": "به\u200cروزرسانی\u200cهای گزارش فروش",
+                "db_table": "analytics_rollup_runs",
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyOrderStatus",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "در انتظار پرداخت"),
+                            ("processing", "در حال پردازش"),
+                            ("shipped", "ارسال شده"),
+                            ("delivered", "تحویل داده شده"),
+                            ("cancelled", "لغو شده"),
+                            ("refunded", "بازگشت وجه"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("orders", models.PositiveIntegerField(default=0)),
+                ("units", models.PositiveIntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=0, default=0, max_digits=16),
+                ),
+            ],
+            options={
+                "verbose_name": "وضعیت روزانه سفارش\u200cها",
+                "verbose_name_plural": "وضعیت روزانه سفارش\u200cها",
+                "db_table": "analytics_daily_order_status",
+                "ordering": ["-date", "status"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("date", "status"), name="daily_order_status_date_status"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyCategorySales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("units", models.PositiveIntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=0, default=0, max_digits=16),
+                ),
+                ("orders", models.PositiveIntegerField(default=0)),
+                (
+                    "category",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_sales",
+                        to="products.category",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "فروش روزانه دسته\u200cبندی",
+                "verbose_name_plural": "فروش روزانه دسته\u200cبندی\u200cها",
+                "db_table": "analytics_daily_category_sales",
+                "ordering": ["-date", "category"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("date", "category"),
+                        name="daily_category_sales_date_category",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyProductSales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("units", models.PositiveIntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=0, default=0, max_digits=16),
+                ),
+                ("orders", models.PositiveIntegerField(default=0)),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_sales",
+                        to="products.product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "فروش روزانه محصول",
+                "verbose_name_plural": "فروش روزانه محصولات",
+                "db_table": "analytics_daily_product_sales",
+                "ordering": ["-date", "product"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("date", "product"),
+                        name="daily_product_sales_date_product",
+                    )
+                ],
+            },
+        ),
+    ]
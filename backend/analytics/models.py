@@ -0,0 +1,117 @@
+"""
+Models for analytics app
+"""
+
+from django.db import models
+from orders.models import Order
+from products.models import Category, Product
+
+
+class DailyProductSales(models.Model):
+    """
+    Units, revenue and orders of one product on one day
+
+    Only counts sales: orders that are paid and not cancelled or refunded.
+    Revenue is the sum of the items' subtotals, before order-level
+    shipping, tax and discounts. Maintained by analytics.rollups.
+    """
+
+    date = models.DateField()
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="daily_sales"
+    )
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=0, default=0)
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = "analytics_daily_product_sales"
+        verbose_name = "فروش روزانه محصول"
+        verbose_name_plural = "فروش روزانه محصولات"
+        ordering = ["-date", "product"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "product"], name="daily_product_sales_date_product"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.product_id}: {self.units}"
+
+
+class DailyCategorySales(models.Model):
+    """
+    Units, revenue and orders of one category's products on one day
+
+    Products are counted under their current category; uncategorized
+    products are left out.
+    """
+
+    date = models.DateField()
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="daily_sales"
+    )
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=0, default=0)
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = "analytics_daily_category_sales"
+        verbose_name = "فروش روزانه دسته‌بندی"
+        verbose_name_plural = "فروش روزانه دسته‌بندی‌ها"
+        ordering = ["-date", "category"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "category"], name="daily_category_sales_date_category"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.category_id}: {self.units}"
+
+
+class DailyOrderStatus(models.Model):
+    """Orders placed on one day by their current status, with their totals"""
+
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=0, default=0)
+
+    class Meta:
+        db_table = "analytics_daily_order_status"
+        verbose_name = "وضعیت روزانه سفارش‌ها"
+        verbose_name_plural = "وضعیت روزانه سفارش‌ها"
+        ordering = ["-date", "status"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "status"], name="daily_order_status_date_status"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.status}: {self.orders}"
+
+
+class SalesRollupRun(models.Model):
+    """Log of sales rollup runs; the latest one is the watermark"""
+
+    orders_until = models.DateTimeField(
+        help_text="سفارش‌های تغییر یافته تا این زمان در گزارش‌ها لحاظ شده‌اند"
+    )
+    is_full = models.BooleanField(default=False)
+    days_updated = models.PositiveIntegerField(default=0)
+    orders_scanned = models.PositiveIntegerField(default=0)
+    duration = models.FloatField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "analytics_rollup_runs"
+        verbose_name = "به‌روزرسانی گزارش فروش"
+        verbose_name_plural = "به‌روزرسانی‌های گزارش فروش"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        kind = "full" if self.is_full else "incremental"
+        return f"{kind} run {self.id} - {self.orders_until}"
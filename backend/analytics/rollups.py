@@ -0,0 +1,202 @@
+"""
+Daily sales rollups for analytics app
+"""
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from orders.models import Order, OrderItem
+from .models import DailyCategorySales, DailyOrderStatus, DailyProductSales, SalesRollupRun
+
+# Orders that count as sales: paid and neither cancelled nor refunded
+SALE_STATUSES = ('processing', 'shipped', 'delivered')
+
+ROLLUP_MODELS = (DailyProductSales, DailyCategorySales, DailyOrderStatus)
+
+# pg_advisory_lock key held by whatever is rewriting rollup rows
+ROLLUP_LOCK_ID = 725001
+
+
+@contextmanager
+def rollup_lock():
+    """
+    Serialize writers of the rollup tables; yields False if another one runs
+
+    Two runs replacing the same day would both delete its rows and then
+    collide on the unique constraints when inserting. The PostgreSQL
+    session lock is released on exit, or with the connection if the
+    process dies.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s)', [ROLLUP_LOCK_ID])
+        acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [ROLLUP_LOCK_ID])
+
+
+def day_start(day):
+    """Start of a local calendar day as an aware datetime"""
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def created_on(days, field='created_at'):
+    """
+    Q matching ``field`` on any of ``days``
+
+    Consecutive days are merged into one range so the orders.created_at
+    index can be used.
+    """
+    runs = []
+    for day in sorted(days):
+        if runs and day == runs[-1][1] + timedelta(days=1):
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    condition = Q()
+    for first, last in runs:
+        condition |= Q(**{
+            f'{field}__gte': day_start(first),
+            f'{field}__lt': day_start(last + timedelta(days=1)),
+        })
+    return condition
+
+
+def order_days(orders):
+    """Distinct local days the given orders were placed on"""
+    return set(
+        orders.order_by()
+        .annotate(day=TruncDate('created_at'))
+        .values_list('day', flat=True)
+        .distinct()
+    )
+
+
+def rollup_days(days):
+    """
+    Recompute every rollup row of ``days`` from orders and order items
+
+    Rows of the days are replaced in one transaction, so days that no
+    longer have sales lose their rows. Returns the number of orders read.
+    """
+    if not days:
+        return 0
+    items = OrderItem.objects.filter(created_on(days, 'order__created_at')).annotate(
+        day=TruncDate('order__created_at')
+    )
+    sold = items.filter(order__status__in=SALE_STATUSES)
+    sales = {
+        'units': Sum('quantity'),
+        'revenue': Sum('subtotal'),
+        'orders': Count('order_id', distinct=True),
+    }
+
+    product_rows = [
+        DailyProductSales(date=row['day'], product_id=row['product_id'], **{
+            field: row[field] for field in sales
+        })
+        for row in sold.order_by().values('day', 'product_id').annotate(**sales)
+    ]
+    category_rows = [
+        DailyCategorySales(date=row['day'], category_id=row['product__category_id'], **{
+            field: row[field] for field in sales
+        })
+        for row in (
+            sold.filter(product__category__isnull=False)
+            .order_by()
+            .values('day', 'product__category_id')
+            .annotate(**sales)
+        )
+    ]
+
+    # Order totals and item units are summed separately so the join to
+    # the items does not multiply the totals
+    units = {
+        (row['day'], row['order__status']): row['units']
+        for row in items.order_by().values('day', 'order__status').annotate(units=Sum('quantity'))
+    }
+    status_rows = [
+        DailyOrderStatus(
+            date=row['day'],
+            status=row['status'],
+            orders=row['orders'],
+            revenue=row['revenue'],
+            units=units.get((row['day'], row['status']), 0),
+        )
+        for row in (
+            Order.objects.filter(created_on(days))
+            .order_by()
+            .annotate(day=TruncDate('created_at'))
+            .values('day', 'status')
+            .annotate(orders=Count('pk'), revenue=Sum('total'))
+        )
+    ]
+
+    with transaction.atomic():
+        for model in ROLLUP_MODELS:
+            model.objects.filter(date__in=days).delete()
+        DailyProductSales.objects.bulk_create(product_rows, batch_size=1000)
+        DailyCategorySales.objects.bulk_create(category_rows, batch_size=1000)
+        DailyOrderStatus.objects.bulk_create(status_rows, batch_size=1000)
+    return sum(row.orders for row in status_rows)
+
+
+def rollup_range(days, batch_days=None):
+    """Recompute ``days`` a batch at a time; returns the number of orders read"""
+    batch_days = batch_days or settings.ANALYTICS_ROLLUP_BATCH_DAYS
+    days = sorted(days)
+    return sum(
+        rollup_days(days[start:start + batch_days])
+        for start in range(0, len(days), batch_days)
+    )
+
+
+def build_sales_rollups(full=False, recent_days=0, batch_days=None):
+    """
+    Bring the daily rollups up to date with the orders table
+
+    Recomputes the days of orders changed since the previous run's
+    watermark, plus the last ``recent_days`` days whether or not they
+    still have orders, which picks up deleted orders. A full run (and
+    the first run) recomputes every day with orders and drops rows of
+    days without any. The watermark trails the clock by
+    ANALYTICS_ROLLUP_LAG seconds so orders saved by transactions still
+    in flight are picked up next time.
+
+    Returns None without doing anything when another run holds the lock.
+    """
+    with rollup_lock() as acquired:
+        if not acquired:
+            return None
+        started = time.monotonic()
+        until = timezone.now() - timedelta(seconds=settings.ANALYTICS_ROLLUP_LAG)
+        previous = SalesRollupRun.objects.first()
+        full = full or previous is None
+
+        if full:
+            days = order_days(Order.objects.all())
+            with transaction.atomic():
+                for model in ROLLUP_MODELS:
+                    model.objects.exclude(date__in=days).delete()
+        else:
+            days = order_days(Order.objects.filter(
+                updated_at__gt=previous.orders_until, updated_at__lte=until
+            ))
+            today = timezone.localdate(until)
+            days |= {today - timedelta(days=i) for i in range(recent_days)}
+
+        orders = rollup_range(days, batch_days)
+        return SalesRollupRun.objects.create(
+            orders_until=until,
+            is_full=full,
+            days_updated=len(days),
+            orders_scanned=orders,
+            duration=round(time.monotonic() - started, 3),
+        )
@@ -0,0 +1,24 @@
+"""
+Serializers for analytics app
+"""
+from datetime import timedelta
+from django.utils import timezone
+from rest_framework import serializers
+
+
+class AnalyticsQuerySerializer(serializers.Serializer):
+    """Query parameters of the analytics endpoints; defaults to the last 30 days"""
+    DEFAULT_DAYS = 30
+
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    interval = serializers.ChoiceField(choices=['day', 'week', 'month'], default='day')
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+    order_by = serializers.ChoiceField(choices=['revenue', 'units'], default='revenue')
+
+    def validate(self, attrs):
+        attrs.setdefault('end', timezone.localdate())
+        attrs.setdefault('start', attrs['end'] - timedelta(days=self.DEFAULT_DAYS - 1))
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError('تاریخ شروع باید قبل از تاریخ پایان باشد')
+        return attrs
@@ -0,0 +1,22 @@
+"""
+Celery tasks for analytics app
+"""
+from celery import shared_task
+from django.conf import settings
+from .rollups import build_sales_rollups
+
+
+@shared_task(bind=True, max_retries=10)
+def update_sales_rollups(self, recent=False):
+    """
+    Refresh daily sales rollups from changed orders
+
+    With recent=True the last ANALYTICS_ROLLUP_RECENT_DAYS days are
+    recomputed as well. Retried while another run holds the lock.
+    """
+    recent_days = settings.ANALYTICS_ROLLUP_RECENT_DAYS if recent else 0
+    run = build_sales_rollups(recent_days=recent_days)
+    if run is None:
+        raise self.retry(countdown=60)
+    kind = "Full" if run.is_full else "Incremental"
+    return f"{kind} sales rollup: {run.days_updated} days, {run.orders_scanned} orders"
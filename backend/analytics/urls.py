@@ -0,0 +1,13 @@
+"""
+URLs for analytics app
+"""
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .views import SalesAnalyticsViewSet
+
+router = DefaultRouter()
+router.register('sales', SalesAnalyticsViewSet, basename='sales-analytics')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
@@ -0,0 +1,118 @@
+"""
+Views for analytics app
+"""
+from django.db.models import DateField, Sum
+from django.db.models.functions import Trunc
+from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from .models import DailyCategorySales, DailyOrderStatus, DailyProductSales, SalesRollupRun
+from .rollups import SALE_STATUSES
+from .serializers import AnalyticsQuerySerializer
+
+TOTALS = {'revenue': Sum('revenue'), 'units': Sum('units'), 'orders': Sum('orders')}
+
+
+class SalesAnalyticsViewSet(viewsets.ViewSet):
+    """
+    Sales reports for staff, read from the daily rollups
+
+    Figures are as fresh as the latest rollup run, returned as ``as_of``.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get_params(self, request):
+        serializer = AnalyticsQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    def in_range(self, queryset, params):
+        return queryset.filter(date__gte=params['start'], date__lte=params['end'])
+
+    def period(self, params):
+        return Trunc('date', params['interval'], output_field=DateField())
+
+    def report(self, params, **data):
+        run = SalesRollupRun.objects.only('orders_until').first()
+        return Response({
+            'start': params['start'],
+            'end': params['end'],
+            'as_of': run.orders_until if run else None,
+            **data,
+        })
+
+    @action(detail=False, methods=['get'])
+    def revenue(self, request):
+        """Sales per day, week or month, plus order counts per status"""
+        params = self.get_params(request)
+        rows = self.in_range(DailyOrderStatus.objects.all(), params).order_by()
+        sales = rows.filter(status__in=SALE_STATUSES)
+
+        series = (
+            sales.annotate(period=self.period(params))
+            .values('period')
+            .annotate(**TOTALS)
+            .order_by('period')
+        )
+        by_status = rows.values('status').annotate(**TOTALS).order_by('status')
+        return self.report(
+            params,
+            totals=sales.aggregate(**TOTALS),
+            series=list(series),
+            by_status=list(by_status),
+        )
+
+    @action(detail=False, methods=['get'], url_path='top-products')
+    def top_products(self, request):
+        """Best selling products by revenue or units"""
+        params = self.get_params(request)
+        products = (
+            self.in_range(DailyProductSales.objects.all(), params)
+            .values('product_id', 'product__name', 'product__sku')
+            .annotate(**TOTALS)
+            .order_by(f"-{params['order_by']}", 'product_id')[:params['limit']]
+        )
+        return self.report(params, products=[
+            {
+                'product': row['product_id'],
+                'name': row['product__name'],
+                'sku': row['product__sku'],
+                'revenue': row['revenue'],
+                'units': row['units'],
+                'orders': row['orders'],
+            }
+            for row in products
+        ])
+
+    @action(detail=False, methods=['get'])
+    def categories(self, request):
+        """Sales of each category per day, week or month"""
+        params = self.get_params(request)
+        rows = (
+            self.in_range(DailyCategorySales.objects.all(), params)
+            .annotate(period=self.period(params))
+            .values('period', 'category_id', 'category__name')
+            .annotate(**TOTALS)
+            .order_by('category_id', 'period')
+        )
+        categories = {}
+        for row in rows:
+            category = categories.setdefault(row['category_id'], {
+                'category': row['category_id'],
+                'name': row['category__name'],
+                'revenue': 0,
+                'units': 0,
+                'orders': 0,
+                'series': [],
+            })
+            for field in TOTALS:
+                category[field] += row[field]
+            category['series'].append({
+                'period': row['period'],
+                'revenue': row['revenue'],
+                'units': row['units'],
+                'orders': row['orders'],
+            })
+        categories = sorted(categories.values(), key=lambda c: c[params['order_by']], reverse=True)
+        return self.report(params, categories=categories)
@@ -7,8 +7,9 @@ import pandas as pd
 import openpyxl
 from django.db import transaction
 from django.utils import timezone
-from django.utils.text import slugify
+from products.cache import batch_version_bumps
 from products.models import Product, Category
+from products.utils import SlugAllocator
 from .models import ExcelImportLog, ProductImportError
 import json
 import re
@@ -159,7 +160,9 @@ class ExcelImportService:
             self.convert_to_json(df)
 
             # Update products with automatic categorization
-            self.update_products()
+            # One catalog cache invalidation for the whole file
+            with batch_version_bumps():
+                self.update_products()
 
             # Mark as complete
             self.import_log.status = "success"
@@ -333,6 +336,7 @@ class ExcelImportService:
         """Update products in database with automatic categorization"""
         successful = 0
         failed = 0
+        new_product_slugs = self._allocate_product_slugs()
 
         for idx, row_data in enumerate(self.json_data, start=1):
             try:
@@ -354,7 +358,6 @@ class ExcelImportService:
                         name=parent_category_name,
                         defaults={
                             "is_active": True,
-                            "slug": slugify(parent_category_name, allow_unicode=True)
                         }
                     )
                     if parent_created:
@@ -366,7 +369,6 @@ class ExcelImportService:
                     defaults={
                         "is_active": True,
                         "parent": parent_category,
-                        "slug": slugify(category_name, allow_unicode=True)
                     }
                 )
                 if cat_created:
@@ -381,7 +383,7 @@ class ExcelImportService:
                         "price": row_data.get("price", 0),
                         "unit": row_data.get("unit", "عدد"),
                         "category": category,
-                        "slug": slugify(f"{product_name}-{sku}", allow_unicode=True)
+                        "slug": new_product_slugs.get(sku),
                     },
                 )
 
@@ -397,7 +399,10 @@ class ExcelImportService:
                     if row_data.get("sale_price"):
                          product.sale_price = row_data["sale_price"]
 
-                    product.save()
+                    # فقط فیلدهای بالا ذخیره می‌شوند تا شمارنده‌های رزرو و فروش دست نخورند
+                    product.save(update_fields=[
+                        "stock_quantity", "price", "name", "unit", "category", "sale_price",
+                    ])
 
                 successful += 1
 
@@ -416,6 +421,22 @@ class ExcelImportService:
         self.import_log.failed_imports = failed
         self.import_log.save()
 
+    def _allocate_product_slugs(self):
+        """Slugs for the SKUs not in the database yet, allocated in one pass"""
+        skus = [row["sku"] for row in self.json_data if row.get("sku")]
+        existing = set(
+            Product.objects.filter(sku__in=skus).values_list("sku", flat=True)
+        )
+        new_rows = {
+            row["sku"]: row.get("name", f"محصول {row['sku']}")
+            for row in self.json_data
+            if row.get("sku") and row["sku"] not in existing
+        }
+        slugs = SlugAllocator(Product).allocate(
+            f"{name}-{sku}" for sku, name in new_rows.items()
+        )
+        return dict(zip(new_rows, slugs))
+
     def log_error(self, row_number, sku, product_name, error_type, error_message):
         """Log an error"""
         ProductImportError.objects.create(
@@ -1,6 +1,7 @@
 """
 SMS notification services for Iranian providers
 """
+import json
 import requests
 from django.conf import settings
 
@@ -58,6 +59,28 @@ class KavenegarSMS:
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
+    def send_array(self, receptors, messages):
+        """Send a different message to each receptor in one request"""
+        url = f"{self.BASE_URL}{self.api_key}/sms/sendarray.json"
+
+        data = {
+            'sender': json.dumps([self.sender] * len(receptors)),
+            'receptor': json.dumps(receptors),
+            'message': json.dumps(messages, ensure_ascii=False),
+        }
+
+        try:
+            response = requests.post(url, data=data, timeout=30)
+            result = response.json()
+
+            if result.get('return', {}).get('status') == 200:
+                return {'success': True, 'sent': len(result.get('entries', []))}
+            else:
+                return {'success': False, 'error': result.get('return', {}).get('message', 'خطای نامشخص')}
+
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
 
 class GhasedakSMS:
     """Ghasedak SMS Service"""
@@ -125,6 +148,9 @@ class GhasedakSMS:
 class SMSService:
     """Main SMS Service that can use different providers"""
     
+    # Messages per Kavenegar sendarray request
+    BULK_LIMIT = 200
+    
     @staticmethod
     def send_order_confirmation(phone_number, order_number):
         """Send order confirmation SMS"""
@@ -184,3 +210,46 @@ class SMSService:
                 return sms.send_sms(phone_number, message)
             except Exception as e:
                 return {'success': False, 'error': str(e)}
+    
+    @staticmethod
+    def order_status_message(status, order_number, tracking_code=None):
+        """Text of the SMS telling a customer their order moved to ``status``"""
+        if status == 'shipped':
+            if tracking_code:
+                return f'سفارش {order_number} ارسال شد. کد رهگیری پستی: {tracking_code}'
+            return f'سفارش {order_number} ارسال شد.'
+        if status == 'delivered':
+            return f'سفارش {order_number} تحویل داده شد. از خرید شما متشکریم.'
+        if status == 'cancelled':
+            return f'سفارش {order_number} لغو شد.'
+        if status == 'refunded':
+            return f'وجه سفارش {order_number} به شما بازگردانده شد.'
+        return None
+    
+    @staticmethod
+    def send_bulk(messages):
+        """
+        Send ``(phone_number, message)`` pairs
+
+        Kavenegar takes up to BULK_LIMIT messages per request; if that
+        fails the remaining messages go out one by one through Ghasedak.
+        Returns the number of messages sent.
+        """
+        sent = 0
+        for start in range(0, len(messages), SMSService.BULK_LIMIT):
+            chunk = messages[start:start + SMSService.BULK_LIMIT]
+            try:
+                result = KavenegarSMS().send_array(
+                    [phone for phone, _ in chunk], [text for _, text in chunk]
+                )
+            except Exception as e:
+                result = {'success': False, 'error': str(e)}
+            if result['success']:
+                sent += len(chunk)
+                continue
+            try:
+                sms = GhasedakSMS()
+                sent += sum(1 for phone, text in chunk if sms.send_sms(phone, text)['success'])
+            except Exception:
+                pass
+        return sent
@@ -1,8 +1,10 @@
 """
 Admin configuration for orders app
 """
-from django.contrib import admin
-from .models import Order, OrderItem, Cart, CartItem, Wishlist
+from django.contrib import admin, messages
+from .models import Order, OrderItem, Cart, CartItem, StockReservation, Wishlist
+from .services import transition_orders
+from .tasks import queue_order_status_sms
 
 
 class OrderItemInline(admin.TabularInline):
@@ -11,6 +13,16 @@ class OrderItemInline(admin.TabularInline):
     readonly_fields = ['product', 'product_name', 'product_sku', 'unit_price', 'quantity', 'subtotal']
 
 
+class StockReservationInline(admin.TabularInline):
+    model = StockReservation
+    extra = 0
+    can_delete = False
+    readonly_fields = ['product', 'quantity', 'status', 'expires_at', 'created_at']
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = [
@@ -19,8 +31,9 @@ class OrderAdmin(admin.ModelAdmin):
     ]
     list_filter = ['status', 'is_paid', 'created_at']
     search_fields = ['order_number', 'user__username', 'shipping_name', 'shipping_phone']
-    inlines = [OrderItemInline]
+    inlines = [OrderItemInline, StockReservationInline]
     readonly_fields = ['order_number', 'user', 'subtotal', 'total', 'created_at', 'updated_at']
+    actions = ['mark_shipped', 'mark_delivered', 'mark_cancelled', 'mark_refunded']
     
     fieldsets = (
         ('اطلاعات سفارش', {
@@ -46,6 +59,35 @@ class OrderAdmin(admin.ModelAdmin):
         }),
     )
 
+    def _transition(self, request, queryset, status):
+        order_ids = list(queryset.values_list('pk', flat=True))
+        moved = transition_orders(order_ids, status)
+        queue_order_status_sms(moved, status)
+        label = dict(Order.STATUS_CHOICES)[status]
+        self.message_user(request, f'{len(moved)} سفارش به وضعیت «{label}» رفت')
+        if len(moved) < len(order_ids):
+            self.message_user(
+                request,
+                f'{len(order_ids) - len(moved)} سفارش در وضعیتی نبود که بتوان آن را تغییر داد',
+                messages.WARNING
+            )
+
+    @admin.action(description='ارسال سفارش‌های انتخاب شده')
+    def mark_shipped(self, request, queryset):
+        self._transition(request, queryset, 'shipped')
+
+    @admin.action(description='تحویل سفارش‌های انتخاب شده')
+    def mark_delivered(self, request, queryset):
+        self._transition(request, queryset, 'delivered')
+
+    @admin.action(description='لغو سفارش‌های انتخاب شده')
+    def mark_cancelled(self, request, queryset):
+        self._transition(request, queryset, 'cancelled')
+
+    @admin.action(description='بازگشت وجه سفارش‌های انتخاب شده')
+    def mark_refunded(self, request, queryset):
+        self._transition(request, queryset, 'refunded')
+
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
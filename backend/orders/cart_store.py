@@ -0,0 +1,428 @@
+"""
+Cart storage for orders app
+
+CART_STORE selects where cart lines live:
+
+* ``database`` - Cart/CartItem rows, written on every change
+* ``redis`` - one Redis hash per cart; changed carts are written back to
+  Cart/CartItem by the flush_cart_store task, and a cart missing from
+  Redis is loaded from the database
+
+Carts belong to a user or, for anonymous visitors, to the token sent in
+the X-Cart-Token header. Both stores return carts in the shape
+CartSerializer expects.
+"""
+import logging
+import re
+import secrets
+import time
+from datetime import datetime, timezone as dt_timezone
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from products.models import Product
+from .models import Cart, CartItem
+
+logger = logging.getLogger(__name__)
+
+CART_TOKEN_HEADER = 'X-Cart-Token'
+_TOKEN_PATTERN = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+
+
+class CartOwner:
+    """The user or anonymous token a cart belongs to"""
+
+    def __init__(self, user_id=None, token=None):
+        self.user_id = user_id
+        self.token = token
+
+    @property
+    def key(self):
+        if self.user_id is not None:
+            return f'user:{self.user_id}'
+        return f'token:{self.token}'
+
+    @property
+    def lookup(self):
+        """Cart.objects filter kwargs"""
+        if self.user_id is not None:
+            return {'user_id': self.user_id}
+        return {'session_token': self.token}
+
+    @classmethod
+    def from_key(cls, key):
+        kind, value = key.split(':', 1)
+        if kind == 'user':
+            return cls(user_id=int(value))
+        return cls(token=value)
+
+
+def valid_cart_token(token):
+    return bool(token) and bool(_TOKEN_PATTERN.match(token))
+
+
+def new_cart_token():
+    return secrets.token_urlsafe(32)
+
+
+def request_cart_token(request):
+    """The anonymous cart token sent with the request, if it is well formed"""
+    token = request.headers.get(CART_TOKEN_HEADER)
+    return token if valid_cart_token(token) else None
+
+
+def cart_items_prefetch():
+    """Cart items with the product and category the cart serializer reads"""
+    return Prefetch(
+        'items',
+        queryset=CartItem.objects.select_related('product__category').order_by('created_at', 'pk'),
+    )
+
+
+def empty_cart(owner):
+    cart = Cart(user_id=owner.user_id, session_token=owner.token)
+    cart._prefetched_objects_cache = {'items': []}
+    return cart
+
+
+class DatabaseCartStore:
+    """Cart lines kept in Cart/CartItem; item ids are CartItem ids"""
+
+    def load(self, owner):
+        """The owner's cart with its items and products prefetched"""
+        cart, _ = Cart.objects.prefetch_related(
+            cart_items_prefetch()
+        ).get_or_create(**owner.lookup)
+        return cart
+
+    def lines(self, owner):
+        """``{product_id: quantity}`` of the owner's cart"""
+        return dict(
+            CartItem.objects.filter(**{f'cart__{k}': v for k, v in owner.lookup.items()})
+            .order_by('created_at', 'pk')
+            .values_list('product_id', 'quantity')
+        )
+
+    def item(self, owner, item_id):
+        """``(product, quantity)`` of one item, or None"""
+        item = (
+            CartItem.objects.select_related('product')
+            .filter(pk=item_id, **{f'cart__{k}': v for k, v in owner.lookup.items()})
+            .first()
+        )
+        return (item.product, item.quantity) if item else None
+
+    def add(self, owner, product, quantity):
+        cart, _ = Cart.objects.get_or_create(**owner.lookup)
+        cart_item, created = CartItem.objects.get_or_create(
+            cart=cart,
+            product=product,
+            defaults={'quantity': quantity}
+        )
+        if not created:
+            cart_item.quantity += quantity
+            cart_item.save()
+
+    def set_quantity(self, owner, item_id, quantity):
+        """Set an item's quantity; zero or less removes it"""
+        items = CartItem.objects.filter(
+            pk=item_id, **{f'cart__{k}': v for k, v in owner.lookup.items()}
+        )
+        if quantity <= 0:
+            items.delete()
+        else:
+            items.update(quantity=quantity, updated_at=timezone.now())
+
+    def remove(self, owner, item_id):
+        self.set_quantity(owner, item_id, 0)
+
+    def clear(self, owner):
+        CartItem.objects.filter(**{f'cart__{k}': v for k, v in owner.lookup.items()}).delete()
+
+    @transaction.atomic
+    def apply(self, owner, quantities):
+        """
+        Set ``{product_id: quantity}`` lines (0 removes) with one bulk
+        insert, update and delete
+        """
+        cart, _ = Cart.objects.get_or_create(**owner.lookup)
+        existing = {
+            item.product_id: item
+            for item in cart.items.select_for_update().filter(product_id__in=list(quantities))
+        }
+        now = timezone.now()
+        changed = []
+        for product_id, quantity in quantities.items():
+            item = existing.get(product_id)
+            if item is not None and quantity > 0 and item.quantity != quantity:
+                item.quantity = quantity
+                item.updated_at = now
+                changed.append(item)
+        CartItem.objects.bulk_update(changed, ['quantity', 'updated_at'])
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product_id=product_id, quantity=quantity)
+            for product_id, quantity in quantities.items()
+            if product_id not in existing and quantity > 0
+        ])
+        removed = [
+            product_id for product_id, quantity in quantities.items()
+            if product_id in existing and quantity <= 0
+        ]
+        if removed:
+            cart.items.filter(product_id__in=removed).delete()
+
+    @transaction.atomic
+    def merge(self, source, target):
+        """Add the source cart's lines to the target cart and delete the source cart"""
+        lines = self.lines(source)
+        if lines:
+            cart, _ = Cart.objects.get_or_create(**target.lookup)
+            existing = {
+                item.product_id: item
+                for item in cart.items.select_for_update().filter(product_id__in=lines)
+            }
+            now = timezone.now()
+            for product_id, quantity in lines.items():
+                if product_id in existing:
+                    existing[product_id].quantity += quantity
+                    existing[product_id].updated_at = now
+            CartItem.objects.bulk_update(existing.values(), ['quantity', 'updated_at'])
+            CartItem.objects.bulk_create([
+                CartItem(cart=cart, product_id=product_id, quantity=quantity)
+                for product_id, quantity in lines.items()
+                if product_id not in existing
+            ])
+        Cart.objects.filter(**source.lookup).delete()
+
+    def flush(self, batch_size=500):
+        """Nothing to write back; returns the number of carts written"""
+        return 0
+
+
+class RedisCartStore:
+    """
+    Cart lines kept in a Redis hash per cart; item ids are product ids
+
+    The hash ``cart:<owner>`` holds ``q:<product_id>`` quantities,
+    ``a:<product_id>`` times the product was added and the cart's
+    ``created``/``updated`` times. Every change adds the owner to the
+    ``cart:dirty`` set that flush() drains into the database.
+    """
+
+    DIRTY_KEY = 'cart:dirty'
+
+    def __init__(self, url):
+        self.url = url
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.url, decode_responses=True)
+        return self._client
+
+    def _key(self, owner):
+        return f'cart:{owner.key}'
+
+    def _read(self, owner):
+        """The cart hash, loaded from the database when Redis does not have it"""
+        data = self.client.hgetall(self._key(owner))
+        if data:
+            return data
+
+        now = time.time()
+        data = {'created': now, 'updated': now}
+        cart = Cart.objects.filter(**owner.lookup).first()
+        if cart is not None:
+            data['created'] = cart.created_at.timestamp()
+            data['updated'] = cart.updated_at.timestamp()
+            previous = 0
+            for product_id, quantity, added in cart.items.order_by('created_at', 'pk').values_list(
+                'product_id', 'quantity', 'created_at'
+            ):
+                # Rows flushed together share created_at; keep their order
+                previous = max(added.timestamp(), previous + 1e-6)
+                data[f'q:{product_id}'] = quantity
+                data[f'a:{product_id}'] = previous
+        pipe = self.client.pipeline()
+        # Another request may have loaded it first; keep whatever is there
+        for field, value in data.items():
+            pipe.hsetnx(self._key(owner), field, value)
+        pipe.expire(self._key(owner), settings.CART_REDIS_TTL)
+        pipe.hgetall(self._key(owner))
+        return pipe.execute()[-1]
+
+    @staticmethod
+    def _lines(data):
+        quantities = {
+            int(field[2:]): int(value)
+            for field, value in data.items()
+            if field.startswith('q:') and int(value) > 0
+        }
+        return dict(sorted(
+            quantities.items(), key=lambda line: float(data.get(f'a:{line[0]}', 0))
+        ))
+
+    def _write(self, owner, *commands):
+        """Run hash commands, touch the cart and mark it for flushing"""
+        key = self._key(owner)
+        self._read(owner)
+        pipe = self.client.pipeline()
+        for name, *args in commands:
+            getattr(pipe, name)(key, *args)
+        pipe.hset(key, 'updated', time.time())
+        pipe.expire(key, settings.CART_REDIS_TTL)
+        pipe.sadd(self.DIRTY_KEY, owner.key)
+        return pipe.execute()
+
+    def load(self, owner):
+        data = self._read(owner)
+        lines = self._lines(data)
+        products = Product.objects.select_related('category').in_bulk(list(lines))
+
+        def moment(value):
+            return datetime.fromtimestamp(float(value), tz=dt_timezone.utc)
+
+        created = data.get('created', time.time())
+        cart = Cart(
+            user_id=owner.user_id,
+            session_token=owner.token,
+            created_at=moment(created),
+            updated_at=moment(data.get('updated', created)),
+        )
+        cart._prefetched_objects_cache = {'items': [
+            CartItem(
+                id=product_id,
+                product=products[product_id],
+                quantity=quantity,
+                created_at=moment(data.get(f'a:{product_id}', created)),
+            )
+            for product_id, quantity in lines.items()
+            if product_id in products
+        ]}
+        return cart
+
+    def lines(self, owner):
+        return self._lines(self._read(owner))
+
+    def item(self, owner, item_id):
+        quantity = int(self._read(owner).get(f'q:{item_id}', 0))
+        if quantity <= 0:
+            return None
+        product = Product.objects.filter(pk=item_id).first()
+        return (product, quantity) if product else None
+
+    def add(self, owner, product, quantity):
+        self._write(
+            owner,
+            ('hincrby', f'q:{product.pk}', quantity),
+            ('hsetnx', f'a:{product.pk}', time.time()),
+        )
+
+    def set_quantity(self, owner, item_id, quantity):
+        if quantity <= 0:
+            self._write(owner, ('hdel', f'q:{item_id}', f'a:{item_id}'))
+        else:
+            self._write(owner, ('hset', f'q:{item_id}', quantity))
+
+    def remove(self, owner, item_id):
+        self.set_quantity(owner, item_id, 0)
+
+    def clear(self, owner):
+        # Redis is not part of the database transaction; wait for it to
+        # commit so a failed checkout leaves the cart alone
+        transaction.on_commit(lambda: self._clear(owner))
+
+    def _clear(self, owner):
+        fields = [field for field in self._read(owner) if field[:2] in ('q:', 'a:')]
+        if fields:
+            self._write(owner, ('hdel', *fields))
+
+    def apply(self, owner, quantities):
+        now = time.time()
+        commands = []
+        for product_id, quantity in quantities.items():
+            if quantity > 0:
+                commands.append(('hset', f'q:{product_id}', quantity))
+                commands.append(('hsetnx', f'a:{product_id}', now))
+            else:
+                commands.append(('hdel', f'q:{product_id}', f'a:{product_id}'))
+        if commands:
+            self._write(owner, *commands)
+
+    def merge(self, source, target):
+        lines = self.lines(source)
+        if lines:
+            now = time.time()
+            commands = []
+            for product_id, quantity in lines.items():
+                commands.append(('hincrby', f'q:{product_id}', quantity))
+                commands.append(('hsetnx', f'a:{product_id}', now))
+            self._write(target, *commands)
+        pipe = self.client.pipeline()
+        pipe.delete(self._key(source))
+        pipe.srem(self.DIRTY_KEY, source.key)
+        pipe.execute()
+        Cart.objects.filter(**source.lookup).delete()
+
+    def flush(self, batch_size=500):
+        """Write changed carts back to Cart/CartItem; returns the number written"""
+        keys = self.client.spop(self.DIRTY_KEY, batch_size) or []
+        flushed = 0
+        for owner_key in keys:
+            try:
+                self.flush_cart(CartOwner.from_key(owner_key))
+            except Exception:
+                # Mark it dirty again so the next flush retries it
+                self.client.sadd(self.DIRTY_KEY, owner_key)
+                logger.exception('Could not flush cart %s', owner_key)
+            else:
+                flushed += 1
+        return flushed
+
+    @transaction.atomic
+    def flush_cart(self, owner):
+        data = self.client.hgetall(self._key(owner))
+        if not data:
+            # Expired before it was flushed; the database copy stands
+            return
+        lines = self._lines(data)
+        existing = set(Product.objects.filter(pk__in=list(lines)).values_list('pk', flat=True))
+        lines = {
+            product_id: quantity for product_id, quantity in lines.items() if product_id in existing
+        }
+        cart, _ = Cart.objects.get_or_create(**owner.lookup)
+        cart.items.exclude(product_id__in=list(lines)).delete()
+        CartItem.objects.bulk_create(
+            [
+                CartItem(cart=cart, product_id=product_id, quantity=quantity)
+                for product_id, quantity in lines.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['cart', 'product'],
+            update_fields=['quantity', 'updated_at'],
+        )
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+
+
+_store = None
+
+
+def get_cart_store():
+    """The cart store selected by settings.CART_STORE"""
+    global _store
+    if _store is None:
+        if settings.CART_STORE == 'redis':
+            _store = RedisCartStore(settings.CART_REDIS_URL)
+        else:
+            _store = DatabaseCartStore()
+    return _store
+
+
+def merge_anonymous_cart(request, user):
+    """Move the cart of the request's X-Cart-Token into the user's cart"""
+    token = request_cart_token(request)
+    if token:
+        get_cart_store().merge(CartOwner(token=token), CartOwner(user_id=user.pk))
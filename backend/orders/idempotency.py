@@ -0,0 +1,111 @@
+"""
+Idempotency-Key support for orders app
+"""
+import hashlib
+import json
+import time
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+# Set on responses served from a stored result
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+# Poll interval while another request with the same key is in flight
+IDEMPOTENCY_POLL_INTERVAL = 0.1
+
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+def _fingerprint(data):
+    body = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _replay(entry):
+    response = Response(entry['data'], status=entry['status'])
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(scope):
+    """
+    Run a view method at most once per user and Idempotency-Key header
+
+    The first request claims the key in the cache and stores its successful
+    (2xx) response for IDEMPOTENCY_KEY_TTL seconds; retries get that
+    response back without running the view again. Other responses depend
+    on state that can change (stock, order status, the gateway), so they
+    release the key and a retry runs the view again. A retry that arrives
+    while the first request is still running waits up to
+    IDEMPOTENCY_LOCK_TIMEOUT seconds for it. The claim itself lasts
+    IDEMPOTENCY_CLAIM_TTL seconds, longer than any request may run. Reusing
+    a key with a different body is rejected. Requests without the header,
+    and anonymous ones, are not affected.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key or not request.user.is_authenticated:
+                return method(self, request, *args, **kwargs)
+            if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+                return Response(
+                    {'error': 'کلید Idempotency-Key بیش از حد طولانی است'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            digest = hashlib.sha256(key.encode()).hexdigest()
+            cache_key = f'idempotency:{scope}:{request.user.pk}:{digest}'
+            fingerprint = _fingerprint(request.data)
+            lock_timeout = settings.IDEMPOTENCY_LOCK_TIMEOUT
+
+            while not cache.add(
+                cache_key,
+                {'state': 'pending', 'fingerprint': fingerprint},
+                settings.IDEMPOTENCY_CLAIM_TTL,
+            ):
+                deadline = time.monotonic() + lock_timeout
+                entry = cache.get(cache_key)
+                while entry is not None and entry['state'] == 'pending':
+                    if entry['fingerprint'] != fingerprint:
+                        break
+                    if time.monotonic() >= deadline:
+                        return Response(
+                            {'error': 'درخواست دیگری با همین کلید در حال انجام است'},
+                            status=status.HTTP_409_CONFLICT
+                        )
+                    time.sleep(IDEMPOTENCY_POLL_INTERVAL)
+                    entry = cache.get(cache_key)
+
+                if entry is None:
+                    # The first request failed or its claim expired; claim it again
+                    continue
+                if entry['fingerprint'] != fingerprint:
+                    return Response(
+                        {'error': 'این کلید Idempotency-Key با درخواست دیگری استفاده شده است'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                return _replay(entry)
+
+            try:
+                response = method(self, request, *args, **kwargs)
+            except Exception:
+                cache.delete(cache_key)
+                raise
+
+            if status.is_success(response.status_code):
+                cache.set(cache_key, {
+                    'state': 'done',
+                    'fingerprint': fingerprint,
+                    'status': response.status_code,
+                    'data': response.data,
+                }, settings.IDEMPOTENCY_KEY_TTL)
+            else:
+                cache.delete(cache_key)
+            return response
+        return wrapper
+    return decorator
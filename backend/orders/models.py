@@ -2,6 +2,8 @@
 Models for orders app
 """
 from django.db import models
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 from products.models import Product
 
@@ -61,6 +63,14 @@ class Order(models.Model):
         verbose_name = 'سفارش'
         verbose_name_plural = 'سفارشات'
         ordering = ['-created_at']
+        indexes = [
+            # Order history pages (OrderPagination seeks on created_at, id)
+            models.Index(
+                fields=['user', '-created_at', '-id'], name='orders_user_recent'
+            ),
+            # Sales rollups pick up orders changed since their watermark
+            models.Index(fields=['updated_at'], name='orders_updated_at'),
+        ]
 
     def __str__(self):
         return f"سفارش {self.order_number} - {self.user.username}"
@@ -101,9 +111,46 @@ class OrderItem(models.Model):
         super().save(*args, **kwargs)
 
 
+class StockReservation(models.Model):
+    """Stock held for an order while it waits for payment"""
+    STATUS_CHOICES = [
+        ('active', 'فعال'),
+        ('consumed', 'مصرف شده'),
+        ('released', 'آزاد شده'),
+    ]
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'stock_reservations'
+        verbose_name = 'رزرو موجودی'
+        verbose_name_plural = 'رزروهای موجودی'
+        indexes = [
+            # The expiry sweeper only looks at active holds
+            models.Index(
+                fields=['expires_at'],
+                condition=models.Q(status='active'),
+                name='reservations_active_expiry',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} x {self.quantity} ({self.status})"
+
+
 class Cart(models.Model):
     """Shopping Cart Model"""
-    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cart')
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name='cart', null=True, blank=True
+    )
+    # Anonymous carts are identified by the X-Cart-Token header (orders.cart_store)
+    session_token = models.CharField(max_length=64, unique=True, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -113,15 +160,40 @@ class Cart(models.Model):
         verbose_name_plural = 'سبدهای خرید'
 
     def __str__(self):
+        if self.user_id is None:
+            return f"سبد خرید مهمان {self.session_token}"
         return f"سبد خرید {self.user.username}"
 
+    def _prefetched_items(self):
+        return getattr(self, "_prefetched_objects_cache", {}).get("items")
+
+    @property
+    def item_list(self):
+        """Items of the cart; carts built by a cart store are not saved"""
+        items = self._prefetched_items()
+        return items if items is not None else self.items.all()
+
     @property
     def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        items = self._prefetched_items()
+        if items is not None:
+            return sum(item.quantity for item in items)
+        return self.items.aggregate(total=Coalesce(Sum("quantity"), 0))["total"]
 
     @property
     def subtotal(self):
-        return sum(item.subtotal for item in self.items.all())
+        items = self._prefetched_items()
+        if items is not None:
+            return sum(item.subtotal for item in items)
+        # effective_price is the database's copy of Product.final_price
+        amount = models.DecimalField(max_digits=12, decimal_places=0)
+        return self.items.aggregate(
+            total=Coalesce(
+                Sum(F("quantity") * F("product__effective_price"), output_field=amount),
+                Value(0),
+                output_field=amount,
+            )
+        )["total"]
 
 
 class CartItem(models.Model):
@@ -0,0 +1,13 @@
+"""
+Pagination classes for orders app
+"""
+from products.pagination import KeysetPagination
+
+
+class OrderPagination(KeysetPagination):
+    """Order history, always paged by (created_at, id) cursors"""
+    keyset_fields = ('created_at',)
+    default_keyset = '-created_at'
+
+    def is_keyset_request(self, request):
+        return True
@@ -3,6 +3,7 @@ Serializers for orders app
 """
 from rest_framework import serializers
 from .models import Order, OrderItem, Cart, CartItem, Wishlist
+from .services import ORDER_TRANSITIONS
 from products.serializers import ProductListSerializer
 
 
@@ -38,6 +39,20 @@ class OrderSerializer(serializers.ModelSerializer):
         ]
 
 
+class OrderListSerializer(serializers.ModelSerializer):
+    """Order history row; items_count and first_item_name are annotated"""
+    items_count = serializers.IntegerField(read_only=True)
+    first_item_name = serializers.CharField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'order_number', 'status', 'total', 'is_paid',
+            'items_count', 'first_item_name', 'tracking_number', 'created_at'
+        ]
+        read_only_fields = fields
+
+
 class OrderCreateSerializer(serializers.Serializer):
     """Serializer for creating orders from cart"""
     shipping_address_id = serializers.IntegerField(required=False)
@@ -65,7 +80,7 @@ class CartItemSerializer(serializers.ModelSerializer):
 
 class CartSerializer(serializers.ModelSerializer):
     """Cart Serializer"""
-    items = CartItemSerializer(many=True, read_only=True)
+    items = CartItemSerializer(many=True, read_only=True, source='item_list')
     total_items = serializers.IntegerField(read_only=True)
     subtotal = serializers.DecimalField(max_digits=12, decimal_places=0, read_only=True)
     
@@ -75,6 +90,42 @@ class CartSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'created_at', 'updated_at']
 
 
+class CartOperationSerializer(serializers.Serializer):
+    """One line change of CartViewSet.batch"""
+    op = serializers.ChoiceField(choices=['add', 'set', 'remove'])
+    product_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=0, default=1)
+
+
+class CartBatchSerializer(serializers.Serializer):
+    """Request body of CartViewSet.batch: line changes applied in order"""
+    LIMIT = 100
+
+    operations = serializers.ListField(
+        child=CartOperationSerializer(), allow_empty=False, max_length=LIMIT
+    )
+
+
+class OrderTransitionSerializer(serializers.Serializer):
+    """Request body of OrderViewSet.transition"""
+    LIMIT = 1000
+
+    order_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=LIMIT
+    )
+    status = serializers.ChoiceField(choices=list(ORDER_TRANSITIONS))
+    # Order id -> tracking number, for orders being shipped
+    tracking_numbers = serializers.DictField(
+        child=serializers.CharField(max_length=100), required=False, default=dict
+    )
+
+    def validate_tracking_numbers(self, value):
+        try:
+            return {int(pk): number for pk, number in value.items()}
+        except ValueError:
+            raise serializers.ValidationError('شناسه سفارش نامعتبر است')
+
+
 class WishlistSerializer(serializers.ModelSerializer):
     """Wishlist Serializer"""
     products = ProductListSerializer(many=True, read_only=True)
@@ -0,0 +1,375 @@
+"""
+Stock and checkout services for orders app
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from products.cache import CATALOG, bump_cache_version
+from products.models import Product
+from .models import Order, OrderItem, StockReservation
+
+logger = logging.getLogger(__name__)
+
+
+class InsufficientStock(Exception):
+    """Raised when a product does not have enough stock for an order"""
+
+    def __init__(self, product):
+        super().__init__(product)
+        self.product = product
+
+    @property
+    def message(self):
+        if self.product is None:
+            return 'موجودی کافی نیست'
+        return f'موجودی کافی برای {self.product.name} وجود ندارد'
+
+
+def lock_products(product_ids):
+    """
+    Lock the products' rows for the current transaction
+
+    Rows are locked in primary key order so concurrent checkouts of
+    overlapping carts cannot deadlock. Returns ``{pk: product}``.
+    """
+    products = (
+        Product.objects.select_for_update()
+        .filter(pk__in=product_ids)
+        .order_by('pk')
+    )
+    return {product.pk: product for product in products}
+
+
+def decrement_stock(quantities):
+    """
+    Take ``{product_id: quantity}`` out of stock with one UPDATE
+
+    Every row is only updated while it still has enough stock; if any of
+    them does not, InsufficientStock is raised and the caller's
+    transaction should roll back.
+    """
+    if not quantities:
+        return
+    enough = Q()
+    for pk, quantity in quantities.items():
+        enough |= Q(pk=pk, stock_quantity__gte=quantity)
+    updated = Product.objects.filter(enough).update(
+        stock_quantity=Case(
+            *[When(pk=pk, then=F('stock_quantity') - quantity) for pk, quantity in quantities.items()]
+        ),
+        sales_count=Case(
+            *[When(pk=pk, then=F('sales_count') + quantity) for pk, quantity in quantities.items()]
+        ),
+        updated_at=timezone.now(),
+    )
+    if updated != len(quantities):
+        raise InsufficientStock(None)
+    # update() sends no signals
+    transaction.on_commit(lambda: bump_cache_version(CATALOG))
+
+
+def create_order_items(order, lines):
+    """
+    bulk_create the order's items from ``(product, quantity)`` pairs
+
+    Prices are taken from the (locked) product rows; subtotal is filled
+    in here because bulk_create does not call OrderItem.save().
+    """
+    items = []
+    for product, quantity in lines:
+        unit_price = product.final_price
+        items.append(OrderItem(
+            order=order,
+            product=product,
+            product_name=product.name,
+            product_sku=product.sku,
+            unit_price=unit_price,
+            quantity=quantity,
+            subtotal=unit_price * quantity,
+        ))
+    return OrderItem.objects.bulk_create(items)
+
+
+def reserve_stock(order, quantities):
+    """
+    Hold ``{product_id: quantity}`` for an order until it is paid
+
+    Holds expire after STOCK_RESERVATION_TTL seconds. Each product's
+    reserved_quantity is raised in one guarded UPDATE, so the sum of holds
+    can never exceed stock; InsufficientStock is raised otherwise.
+    """
+    enough = Q()
+    for pk, quantity in quantities.items():
+        enough |= Q(pk=pk, stock_quantity__gte=F('reserved_quantity') + quantity)
+    # reserved_quantity is not part of any catalog response, so updated_at
+    # and the catalog cache are left alone
+    updated = Product.objects.filter(enough).update(
+        reserved_quantity=Case(
+            *[When(pk=pk, then=F('reserved_quantity') + quantity) for pk, quantity in quantities.items()]
+        ),
+    )
+    if updated != len(quantities):
+        raise InsufficientStock(None)
+
+    expires_at = timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+    return StockReservation.objects.bulk_create([
+        StockReservation(order=order, product_id=pk, quantity=quantity, expires_at=expires_at)
+        for pk, quantity in quantities.items()
+    ])
+
+
+def _close_reservations(reservations, status):
+    """Lock active holds, mark them ``status`` and return ``{product_id: quantity}``"""
+    holds = list(
+        reservations.filter(status='active')
+        .select_for_update()
+        .order_by('product_id', 'pk')
+        .values_list('pk', 'product_id', 'quantity')
+    )
+    if not holds:
+        return {}
+    quantities = Counter()
+    for _, product_id, quantity in holds:
+        quantities[product_id] += quantity
+    StockReservation.objects.filter(pk__in=[pk for pk, _, _ in holds]).update(
+        status=status, updated_at=timezone.now()
+    )
+    return dict(quantities)
+
+
+@transaction.atomic
+def release_reservations(reservations):
+    """Give the stock held by active reservations back; returns the products touched"""
+    quantities = _close_reservations(reservations, 'released')
+    if quantities:
+        # Clamped so a counter that drifted cannot fail the whole release
+        Product.objects.filter(pk__in=quantities).update(
+            reserved_quantity=Case(
+                *[
+                    When(pk=pk, then=Greatest(F('reserved_quantity') - quantity, 0))
+                    for pk, quantity in quantities.items()
+                ]
+            ),
+        )
+    return len(quantities)
+
+
+def _order_quantities(order):
+    quantities = Counter()
+    for product_id, quantity in order.items.values_list('product_id', 'quantity'):
+        quantities[product_id] += quantity
+    return dict(quantities)
+
+
+@transaction.atomic
+def mark_order_paid(order):
+    """
+    Mark an order paid and take its held stock out of inventory
+
+    If the holds already expired the stock is taken directly; when it has
+    sold out in the meantime the order is still marked paid and the
+    shortage is logged for staff to resolve. Orders placed before stock
+    was reserved had their stock taken at checkout. Repeated callbacks
+    for a paid order change nothing.
+    """
+    # Lock the order so concurrent callbacks cannot take the stock twice
+    locked = Order.objects.select_for_update().get(pk=order.pk)
+    if locked.is_paid:
+        order.is_paid, order.paid_at, order.status = locked.is_paid, locked.paid_at, locked.status
+        return
+    locked.is_paid = True
+    locked.paid_at = timezone.now()
+    locked.status = 'processing'
+    locked.save(update_fields=['is_paid', 'paid_at', 'status', 'updated_at'])
+    order.is_paid, order.paid_at, order.status = locked.is_paid, locked.paid_at, locked.status
+
+    quantities = _close_reservations(order.reservations.all(), 'consumed')
+    if quantities:
+        Product.objects.filter(pk__in=quantities).update(
+            stock_quantity=Case(
+                *[When(pk=pk, then=F('stock_quantity') - quantity) for pk, quantity in quantities.items()]
+            ),
+            reserved_quantity=Case(
+                *[When(pk=pk, then=F('reserved_quantity') - quantity) for pk, quantity in quantities.items()]
+            ),
+            sales_count=Case(
+                *[When(pk=pk, then=F('sales_count') + quantity) for pk, quantity in quantities.items()]
+            ),
+            updated_at=timezone.now(),
+        )
+        transaction.on_commit(lambda: bump_cache_version(CATALOG))
+    elif order.reservations.filter(status='released').exists():
+        try:
+            with transaction.atomic():
+                decrement_stock(_order_quantities(order))
+                # Consumed holds are what return_stock() gives back
+                order.reservations.filter(status='released').update(
+                    status='consumed', updated_at=timezone.now()
+                )
+        except InsufficientStock:
+            logger.warning(
+                'Order %s was paid after its stock hold expired and sold out',
+                order.order_number,
+            )
+
+
+@transaction.atomic
+def cancel_order(order):
+    """
+    Cancel an order and give back whatever stock it holds or took
+
+    Pending orders release their active holds; orders that took their
+    stock put their items back.
+    Returns False, changing nothing, when the order's current status
+    cannot be cancelled.
+    """
+    # Lock the order so a concurrent cancel cannot give stock back twice
+    locked = Order.objects.select_for_update().get(pk=order.pk)
+    order.status = locked.status
+    if locked.status not in ORDER_TRANSITIONS['cancelled']:
+        return False
+    return_stock([order.pk])
+
+    locked.status = 'cancelled'
+    locked.save(update_fields=['status', 'updated_at'])
+    order.status = locked.status
+    return True
+
+
+def return_stock(order_ids):
+    """
+    Give back the stock held or taken by the given orders
+
+    Orders with active holds release them. Consumed holds, and the items
+    of orders placed before stock was reserved, were taken out of stock
+    and are put back with one aggregated UPDATE. Released holds hold
+    nothing, including those of orders paid after the holds expired when
+    the stock had sold out.
+    """
+    statuses = {}
+    for order_id, reservation_status in (
+        StockReservation.objects.filter(order_id__in=order_ids)
+        .order_by()
+        .values_list('order_id', 'status')
+        .distinct()
+    ):
+        statuses.setdefault(order_id, set()).add(reservation_status)
+
+    holding = [pk for pk in order_ids if 'active' in statuses.get(pk, ())]
+    if holding:
+        release_reservations(StockReservation.objects.filter(order_id__in=holding))
+
+    quantities = Counter()
+    consumed = [pk for pk in order_ids if 'consumed' in statuses.get(pk, ())]
+    for product_id, quantity in (
+        StockReservation.objects.filter(order_id__in=consumed, status='consumed')
+        .values_list('product_id', 'quantity')
+    ):
+        quantities[product_id] += quantity
+    unreserved = [pk for pk in order_ids if pk not in statuses]
+    for product_id, quantity in (
+        OrderItem.objects.filter(order_id__in=unreserved).values_list('product_id', 'quantity')
+    ):
+        quantities[product_id] += quantity
+    restore_stock(dict(quantities))
+
+
+def restore_stock(quantities):
+    """Put ``{product_id: quantity}`` back into stock with one UPDATE"""
+    if not quantities:
+        return
+    Product.objects.filter(pk__in=quantities).update(
+        stock_quantity=Case(
+            *[When(pk=pk, then=F('stock_quantity') + quantity) for pk, quantity in quantities.items()]
+        ),
+        sales_count=Case(
+            *[
+                When(pk=pk, then=Greatest(F('sales_count') - quantity, 0))
+                for pk, quantity in quantities.items()
+            ]
+        ),
+        updated_at=timezone.now(),
+    )
+    transaction.on_commit(lambda: bump_cache_version(CATALOG))
+
+
+def expire_reservations(batch_size=500):
+    """
+    Release holds that expired or whose order was cancelled
+
+    Unpaid pending orders whose holds expired are cancelled. Returns the
+    number of orders processed.
+    """
+    now = timezone.now()
+    order_ids = list(
+        StockReservation.objects.filter(status='active')
+        .filter(Q(expires_at__lte=now) | Q(order__status='cancelled'))
+        .order_by()
+        .values_list('order_id', flat=True)
+        .distinct()[:batch_size]
+    )
+    if not order_ids:
+        return 0
+    with transaction.atomic():
+        release_reservations(StockReservation.objects.filter(
+            Q(expires_at__lte=now) | Q(order__status='cancelled'),
+            order_id__in=order_ids,
+        ))
+        Order.objects.filter(pk__in=order_ids, status='pending', is_paid=False).update(
+            status='cancelled', updated_at=now
+        )
+    return len(order_ids)
+
+
+# Target status -> statuses an order can be moved to it from in bulk. Orders
+# only become 'processing' when their payment is verified.
+ORDER_TRANSITIONS = {
+    'shipped': ['processing'],
+    'delivered': ['shipped'],
+    'cancelled': ['pending', 'processing'],
+    'refunded': ['shipped', 'delivered'],
+}
+
+
+@transaction.atomic
+def transition_orders(order_ids, status, tracking_numbers=None):
+    """
+    Move orders to ``status`` with a few set-based UPDATEs
+
+    Only orders currently in one of ORDER_TRANSITIONS[status] are moved;
+    the rest are left alone. Shipping stamps shipped_at and, when given,
+    the ``{order_id: tracking_number}`` of each order; cancelling gives
+    back the orders' stock in one UPDATE per table. Returns the ids of
+    the orders moved.
+    """
+    moved = list(
+        Order.objects.select_for_update()
+        .filter(pk__in=order_ids, status__in=ORDER_TRANSITIONS[status])
+        .order_by('pk')
+        .values_list('pk', flat=True)
+    )
+    if not moved:
+        return []
+
+    now = timezone.now()
+    fields = {'status': status, 'updated_at': now}
+    if status == 'shipped':
+        fields['shipped_at'] = now
+        numbers = [(pk, tracking_numbers[pk]) for pk in moved if pk in (tracking_numbers or {})]
+        if numbers:
+            fields['tracking_number'] = Case(
+                *[When(pk=pk, then=Value(number)) for pk, number in numbers],
+                default=F('tracking_number'),
+            )
+    elif status == 'delivered':
+        fields['delivered_at'] = now
+    elif status == 'cancelled':
+        return_stock(moved)
+
+    Order.objects.filter(pk__in=moved).update(**fields)
+    return moved
@@ -0,0 +1,63 @@
+"""
+Celery tasks for orders app
+"""
+import logging
+from celery import shared_task
+from django.db import transaction
+from notifications.services import SMSService
+from .cart_store import get_cart_store
+from .models import Order
+from .services import expire_reservations
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def expire_stock_reservations():
+    """Release expired or cancelled stock holds and cancel unpaid orders"""
+    orders = expire_reservations()
+    return f"Released stock holds of {orders} orders"
+
+
+@shared_task
+def flush_cart_store():
+    """Write carts changed in the cart store back to Cart/CartItem"""
+    carts = get_cart_store().flush()
+    return f"Flushed {carts} carts"
+
+
+@shared_task
+def send_order_status_sms(order_ids, status):
+    """Tell the customers of orders that are now in ``status``, in bulk"""
+    orders = Order.objects.filter(pk__in=order_ids, status=status).values_list(
+        'order_number', 'shipping_phone', 'tracking_number'
+    )
+    messages = [
+        (phone, SMSService.order_status_message(status, order_number, tracking_number))
+        for order_number, phone, tracking_number in orders
+        if phone
+    ]
+    sent = SMSService.send_bulk(messages)
+    return f"Sent {sent}/{len(messages)} order status messages"
+
+
+def queue_order_status_sms(order_ids, status):
+    """
+    Queue the status SMS of orders once the current transaction commits
+
+    The messages are never sent inside the request: when the broker is
+    unreachable they are dropped and the failure is logged.
+    """
+    if not order_ids or SMSService.order_status_message(status, '') is None:
+        return
+    order_ids = list(order_ids)
+
+    def dispatch():
+        try:
+            send_order_status_sms.delay(order_ids, status)
+        except Exception:
+            logger.exception(
+                'Could not queue %s SMS for %s orders', status, len(order_ids)
+            )
+
+    transaction.on_commit(dispatch)
@@ -4,25 +4,61 @@ Views for orders app
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from .models import Order, OrderItem, Cart, CartItem, Wishlist
 from products.models import Product
+from .cart_store import (
+    CART_TOKEN_HEADER, CartOwner, cart_items_prefetch, empty_cart, get_cart_store,
+    new_cart_token, request_cart_token
+)
+from .idempotency import idempotent
+from .pagination import OrderPagination
+from .services import (
+    InsufficientStock, cancel_order, create_order_items, lock_products, reserve_stock,
+    transition_orders
+)
 from .serializers import (
-    OrderSerializer, OrderCreateSerializer, CartSerializer,
-    CartItemSerializer, WishlistSerializer
+    OrderSerializer, OrderListSerializer, OrderCreateSerializer, OrderTransitionSerializer,
+    CartSerializer, CartBatchSerializer, CartItemSerializer, WishlistSerializer
 )
+from .tasks import queue_order_status_sms
 
 
 class OrderViewSet(viewsets.ModelViewSet):
     """ViewSet for orders"""
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = OrderPagination
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        queryset = Order.objects.filter(user=self.request.user)
+        if self.action == 'list':
+            # One query for the page: item counts and names come from subqueries
+            items = OrderItem.objects.filter(order=OuterRef('pk')).order_by()
+            return queryset.annotate(
+                items_count=Coalesce(
+                    Subquery(
+                        items.values('order').annotate(count=Count('pk')).values('count'),
+                        output_field=IntegerField(),
+                    ),
+                    0,
+                ),
+                first_item_name=Subquery(items.order_by('pk').values('product_name')[:1]),
+            ).only(
+                'order_number', 'status', 'total', 'is_paid', 'tracking_number', 'created_at'
+            )
+        return queryset.prefetch_related('items')
 
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return OrderListSerializer
+        return OrderSerializer
+
+    @idempotent('orders.create')
     @transaction.atomic
     def create(self, request, *args, **kwargs):
         """Create order from cart"""
@@ -31,22 +67,37 @@ class OrderViewSet(viewsets.ModelViewSet):
         
         user = request.user
         
-        # Get or create cart
-        cart, _ = Cart.objects.get_or_create(user=user)
-        
-        if not cart.items.exists():
+        # Cart lines from the configured cart store
+        owner = CartOwner(user_id=user.pk)
+        quantities = get_cart_store().lines(owner)
+
+        # Lock the products so stock and prices cannot change under us
+        products = lock_products(quantities)
+        quantities = {pk: quantity for pk, quantity in quantities.items() if pk in products}
+        lines = [(products[pk], quantity) for pk, quantity in quantities.items()]
+
+        if not lines:
             return Response(
                 {'error': 'سبد خرید شما خالی است'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
+
+        # Check stock not held by other pending orders
+        for product, quantity in lines:
+            if product.available_quantity < quantity:
+                transaction.set_rollback(True)
+                return Response(
+                    {'error': InsufficientStock(product).message},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
         # Calculate totals
-        subtotal = cart.subtotal
+        subtotal = sum(product.final_price * quantity for product, quantity in lines)
         shipping_cost = 30000  # Fixed shipping cost - customize as needed
         tax = 0  # Add tax calculation if needed
         discount = 0  # Add discount logic if needed
         total = subtotal + shipping_cost + tax - discount
-        
+
         # Create order
         order = Order.objects.create(
             user=user,
@@ -64,33 +115,21 @@ class OrderViewSet(viewsets.ModelViewSet):
             notes=serializer.validated_data.get('notes', ''),
             payment_method=serializer.validated_data['payment_method'],
         )
-        
-        # Create order items from cart
-        for cart_item in cart.items.all():
-            # Check stock
-            if cart_item.product.stock_quantity < cart_item.quantity:
-                transaction.set_rollback(True)
-                return Response(
-                    {'error': f'موجودی کافی برای {cart_item.product.name} وجود ندارد'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                product_name=cart_item.product.name,
-                product_sku=cart_item.product.sku,
-                unit_price=cart_item.unit_price,
-                quantity=cart_item.quantity,
+
+        # Hold stock until the order is paid and create order items from cart
+        try:
+            reserve_stock(order, quantities)
+        except InsufficientStock as exc:
+            transaction.set_rollback(True)
+            return Response(
+                {'error': exc.message},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            
-            # Reduce stock
-            cart_item.product.stock_quantity -= cart_item.quantity
-            cart_item.product.save()
-        
+        create_order_items(order, lines)
+
         # Clear cart
-        cart.items.all().delete()
-        
+        get_cart_store().clear(owner)
+
         return Response({
             'message': 'سفارش با موفقیت ثبت شد',
             'order': OrderSerializer(order).data
@@ -101,35 +140,91 @@ class OrderViewSet(viewsets.ModelViewSet):
         """Cancel an order"""
         order = self.get_object()
         
-        if order.status not in ['pending', 'processing']:
+        # Release held stock or restore taken stock
+        if not cancel_order(order):
             return Response(
                 {'error': 'فقط سفارشات در حال پردازش قابل لغو هستند'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Restore stock
-        for item in order.items.all():
-            item.product.stock_quantity += item.quantity
-            item.product.save()
-        
-        order.status = 'cancelled'
-        order.save()
-        
         return Response({'message': 'سفارش لغو شد'})
 
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def transition(self, request):
+        """
+        Move many orders to another status at once (staff only)
+
+        Orders that cannot move to the status from their current one are
+        skipped and listed in the response. Customers are notified by SMS
+        in the background.
+        """
+        serializer = OrderTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        order_ids = serializer.validated_data['order_ids']
+        new_status = serializer.validated_data['status']
+
+        moved = transition_orders(
+            order_ids, new_status, serializer.validated_data['tracking_numbers']
+        )
+        queue_order_status_sms(moved, new_status)
+
+        moved_ids = set(moved)
+        return Response({
+            'message': f'وضعیت {len(moved)} سفارش تغییر کرد',
+            'updated': moved,
+            'skipped': sorted({pk for pk in order_ids if pk not in moved_ids}),
+        })
+
 
 class CartViewSet(viewsets.ModelViewSet):
     """ViewSet for shopping cart"""
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
+    # Actions open to anonymous visitors, whose carts follow X-Cart-Token
+    anonymous_actions = ['list', 'add_item', 'update_item', 'remove_item', 'batch', 'clear']
+
+    def get_permissions(self):
+        if self.action in self.anonymous_actions:
+            return [AllowAny()]
+        return super().get_permissions()
 
     def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user)
+        if not self.request.user.is_authenticated:
+            return Cart.objects.none()
+        return Cart.objects.filter(user=self.request.user).prefetch_related(cart_items_prefetch())
+
+    def get_owner(self, create=False):
+        """
+        Owner of the request's cart
+
+        Anonymous requests without a cart token get None, or a new token
+        (returned in the X-Cart-Token response header) when ``create``.
+        """
+        if self.request.user.is_authenticated:
+            return CartOwner(user_id=self.request.user.pk)
+        token = request_cart_token(self.request)
+        if token is None and create:
+            token = self.issued_cart_token = new_cart_token()
+        return CartOwner(token=token) if token else None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, 'issued_cart_token', None)
+        if token:
+            response[CART_TOKEN_HEADER] = token
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def get_cart(self, owner):
+        """The owner's cart with its items and products loaded"""
+        if owner is None:
+            return empty_cart(CartOwner())
+        return get_cart_store().load(owner)
+
+    def cart_data(self, owner):
+        return CartSerializer(self.get_cart(owner), context={'request': self.request}).data
 
     def list(self, request, *args, **kwargs):
         """Get user's cart"""
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-        serializer = self.get_serializer(cart)
+        serializer = self.get_serializer(self.get_cart(self.get_owner()))
         return Response(serializer.data)
 
     @action(detail=False, methods=['post'])
@@ -152,27 +247,19 @@ class CartViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Check stock
-        if product.stock_quantity < quantity:
+        # Check stock not held by pending orders
+        if product.available_quantity < quantity:
             return Response(
                 {'error': 'موجودی کافی نیست'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            defaults={'quantity': quantity}
-        )
-        
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
+        owner = self.get_owner(create=True)
+        get_cart_store().add(owner, product, quantity)
         
         return Response({
             'message': 'محصول به سبد خرید اضافه شد',
-            'cart': CartSerializer(cart, context={'request': request}).data
+            'cart': self.cart_data(owner)
         })
 
     @action(detail=False, methods=['post'])
@@ -181,36 +268,33 @@ class CartViewSet(viewsets.ModelViewSet):
         item_id = request.data.get('item_id')
         quantity = int(request.data.get('quantity', 1))
         
-        try:
-            cart_item = CartItem.objects.get(
-                id=item_id,
-                cart__user=request.user
-            )
-        except CartItem.DoesNotExist:
+        owner = self.get_owner()
+        store = get_cart_store()
+        item = store.item(owner, item_id) if owner and item_id else None
+        if item is None:
             return Response(
                 {'error': 'آیتم یافت نشد'},
                 status=status.HTTP_404_NOT_FOUND
             )
         
         if quantity <= 0:
-            cart_item.delete()
+            store.remove(owner, item_id)
             message = 'محصول از سبد خرید حذف شد'
         else:
-            # Check stock
-            if cart_item.product.stock_quantity < quantity:
+            # Check stock not held by pending orders
+            product, _ = item
+            if product.available_quantity < quantity:
                 return Response(
                     {'error': 'موجودی کافی نیست'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            cart_item.quantity = quantity
-            cart_item.save()
+            store.set_quantity(owner, item_id, quantity)
             message = 'تعداد محصول به‌روزرسانی شد'
         
-        cart = cart_item.cart
         return Response({
             'message': message,
-            'cart': CartSerializer(cart, context={'request': request}).data
+            'cart': self.cart_data(owner)
         })
 
     @action(detail=False, methods=['post'])
@@ -218,29 +302,87 @@ class CartViewSet(viewsets.ModelViewSet):
         """Remove item from cart"""
         item_id = request.data.get('item_id')
         
-        try:
-            cart_item = CartItem.objects.get(
-                id=item_id,
-                cart__user=request.user
-            )
-            cart = cart_item.cart
-            cart_item.delete()
-            
-            return Response({
-                'message': 'محصول از سبد خرید حذف شد',
-                'cart': CartSerializer(cart, context={'request': request}).data
-            })
-        except CartItem.DoesNotExist:
+        owner = self.get_owner()
+        store = get_cart_store()
+        if not owner or not item_id or store.item(owner, item_id) is None:
             return Response(
                 {'error': 'آیتم یافت نشد'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        
+        store.remove(owner, item_id)
+        
+        return Response({
+            'message': 'محصول از سبد خرید حذف شد',
+            'cart': self.cart_data(owner)
+        })
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Apply many add, set and remove operations in one request
+
+        Operations refer to products and run in order. Products added or
+        raised are checked for stock with one query; nothing changes unless
+        every line is valid. The cart is returned once.
+        """
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        owner = self.get_owner(create=True)
+        store = get_cart_store()
+        current = store.lines(owner)
+        quantities = dict(current)
+        for operation in serializer.validated_data['operations']:
+            product_id = operation['product_id']
+            if operation['op'] == 'add':
+                quantities[product_id] = quantities.get(product_id, 0) + operation['quantity']
+            elif operation['op'] == 'set':
+                quantities[product_id] = operation['quantity']
+            else:
+                quantities[product_id] = 0
+        changes = {
+            product_id: quantity for product_id, quantity in quantities.items()
+            if quantity != current.get(product_id, 0)
+        }
+
+        raised = [
+            product_id for product_id, quantity in changes.items()
+            if quantity > current.get(product_id, 0)
+        ]
+        products = Product.objects.filter(is_active=True).only(
+            'stock_quantity', 'reserved_quantity'
+        ).in_bulk(raised)
+        missing = [product_id for product_id in raised if product_id not in products]
+        if missing:
+            return Response(
+                {'error': 'محصول یافت نشد', 'products': missing},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        # Check stock not held by pending orders
+        short = [
+            product_id for product_id in raised
+            if products[product_id].available_quantity < changes[product_id]
+        ]
+        if short:
+            return Response(
+                {'error': 'موجودی کافی نیست', 'products': short},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        store.apply(owner, changes)
+
+        return Response({
+            'message': 'سبد خرید به‌روزرسانی شد',
+            'cart': self.cart_data(owner)
+        })
 
     @action(detail=False, methods=['post'])
     def clear(self, request):
         """Clear cart"""
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-        cart.items.all().delete()
+        owner = self.get_owner()
+        if owner:
+            get_cart_store().clear(owner)
         
         return Response({'message': 'سبد خرید خالی شد'})
 
@@ -253,9 +395,16 @@ class WishlistViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return Wishlist.objects.filter(user=self.request.user)
 
+    def get_wishlist(self):
+        """Get or create the user's wishlist with its products prefetched"""
+        wishlist, _ = Wishlist.objects.prefetch_related(
+            Prefetch('products', queryset=Product.objects.select_related('category'))
+        ).get_or_create(user=self.request.user)
+        return wishlist
+
     def list(self, request, *args, **kwargs):
         """Get user's wishlist"""
-        wishlist, _ = Wishlist.objects.get_or_create(user=request.user)
+        wishlist = self.get_wishlist()
         serializer = self.get_serializer(wishlist, context={'request': request})
         return Response(serializer.data)
 
@@ -277,7 +426,7 @@ class WishlistViewSet(viewsets.ModelViewSet):
         
         return Response({
             'message': 'محصول به لیست علاقه‌مندی اضافه شد',
-            'wishlist': WishlistSerializer(wishlist, context={'request': request}).data
+            'wishlist': WishlistSerializer(self.get_wishlist(), context={'request': request}).data
         })
 
     @action(detail=False, methods=['post'])
@@ -292,7 +441,7 @@ class WishlistViewSet(viewsets.ModelViewSet):
             
             return Response({
                 'message': 'محصول از لیست علاقه‌مندی حذف شد',
-                'wishlist': WishlistSerializer(wishlist, context={'request': request}).data
+                'wishlist': WishlistSerializer(self.get_wishlist(), context={'request': request}).data
             })
         except Product.DoesNotExist:
             return Response(
@@ -4,6 +4,7 @@ Payment gateway services
 import requests
 from django.conf import settings
 from django.utils import timezone
+from orders.services import mark_order_paid
 from .models import Payment, PaymentLog
 
 
@@ -99,11 +100,8 @@ class ZarinpalGateway:
                 payment.gateway_response = result
                 payment.save()
                 
-                # Update order
-                payment.order.is_paid = True
-                payment.order.paid_at = timezone.now()
-                payment.order.status = 'processing'
-                payment.order.save()
+                # Update order and take its held stock
+                mark_order_paid(payment.order)
                 
                 return {'success': True, 'ref_id': result['RefID']}
             else:
@@ -227,11 +225,8 @@ class PayPingGateway:
                 payment.gateway_response = result
                 payment.save()
                 
-                # Update order
-                payment.order.is_paid = True
-                payment.order.paid_at = timezone.now()
-                payment.order.status = 'processing'
-                payment.order.save()
+                # Update order and take its held stock
+                mark_order_paid(payment.order)
                 
                 return {'success': True, 'ref_id': ref_id}
             else:
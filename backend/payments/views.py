@@ -7,6 +7,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import redirect
 from django.conf import settings
+from orders.idempotency import idempotent
 from orders.models import Order
 from .models import Payment, PaymentLog
 from .serializers import PaymentSerializer, PaymentRequestSerializer
@@ -22,6 +23,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
         return Payment.objects.filter(order__user=self.request.user)
 
     @action(detail=False, methods=['post'])
+    @idempotent('payments.request')
     def request(self, request):
         """Request a new payment"""
         serializer = PaymentRequestSerializer(data=request.data)
@@ -43,6 +45,12 @@ class PaymentViewSet(viewsets.ModelViewSet):
                 {'error': 'این سفارش قبلاً پرداخت شده است'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+
+        if order.status == 'cancelled':
+            return Response(
+                {'error': 'این سفارش لغو شده است'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         # Create payment
         payment = Payment.objects.create(
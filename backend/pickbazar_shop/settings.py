@@ -5,6 +5,8 @@ Django settings for pickbazar_shop project.
 from pathlib import Path
 from decouple import config
 from datetime import timedelta
+from celery.schedules import crontab
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -25,6 +27,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Third party apps
     'rest_framework',
@@ -40,6 +43,7 @@ INSTALLED_APPS = [
     'payments',
     'excel_import',
     'notifications',
+    'analytics',
 ]
 
 MIDDLEWARE = [
@@ -159,6 +163,10 @@ CORS_ALLOWED_ORIGINS = config(
 ).split(',')
 
 CORS_ALLOW_CREDENTIALS = True
+# Anonymous carts are identified by X-Cart-Token (orders.cart_store);
+# retried checkouts and payments send Idempotency-Key (orders.idempotency)
+CORS_ALLOW_HEADERS = (*default_headers, 'x-cart-token', 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['X-Cart-Token', 'Idempotent-Replayed']
 
 # Payment Gateway Settings
 ZARINPAL_MERCHANT_ID = config('ZARINPAL_MERCHANT_ID', default='')
@@ -183,6 +191,96 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'rebuild-related-products': {
+        'task': 'products.tasks.rebuild_related_products',
+        'schedule': crontab(minute=15),
+    },
+    'rebuild-related-products-full': {
+        'task': 'products.tasks.rebuild_related_products',
+        'schedule': crontab(hour=3, minute=45),
+        'kwargs': {'full': True},
+    },
+    'expire-stock-reservations': {
+        'task': 'orders.tasks.expire_stock_reservations',
+        'schedule': crontab(),
+    },
+    'flush-cart-store': {
+        'task': 'orders.tasks.flush_cart_store',
+        'schedule': crontab(),
+    },
+    'update-sales-rollups': {
+        'task': 'analytics.tasks.update_sales_rollups',
+        'schedule': crontab(minute='*/5'),
+    },
+    # Off the 5-minute grid; also recomputes the last days to drop deleted orders
+    'update-sales-rollups-recent': {
+        'task': 'analytics.tasks.update_sales_rollups',
+        'schedule': crontab(hour=4, minute=17),
+        'kwargs': {'recent': True},
+    },
+}
+
+# Cache Configuration
+# Celery's Redis by default; CACHE_URL=locmem:// keeps the cache in process memory
+CACHE_URL = config('CACHE_URL', default=CELERY_BROKER_URL)
+if CACHE_URL.startswith('locmem'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+            'KEY_PREFIX': 'pickbazar',
+        }
+    }
+
+# Anonymous catalog responses (see products.cache.cache_response)
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', default=300, cast=int)
+# How long concurrent misses wait for the request rebuilding an entry
+RESPONSE_CACHE_LOCK_TIMEOUT = config('RESPONSE_CACHE_LOCK_TIMEOUT', default=5, cast=int)
+
+# Product search
+SUGGEST_CACHE_TIMEOUT = config('SUGGEST_CACHE_TIMEOUT', default=60, cast=int)
+FACETS_CACHE_TIMEOUT = config('FACETS_CACHE_TIMEOUT', default=300, cast=int)
+# Upper bounds (toman) of the price histogram buckets in product facets
+FACET_PRICE_BUCKETS = [50000, 100000, 250000, 500000, 1000000, 2500000]
+# Co-purchase neighbours kept per product (products.related)
+RELATED_PRODUCTS_TOP_K = config('RELATED_PRODUCTS_TOP_K', default=12, cast=int)
+
+# Image variants
+# Widths (px) of the WebP/JPEG copies generated for uploaded images
+IMAGE_VARIANT_WIDTHS = [160, 320, 640, 1024]
+IMAGE_VARIANT_QUALITY = config('IMAGE_VARIANT_QUALITY', default=80, cast=int)
+
+# Checkout
+# Seconds a pending order holds its stock before the sweeper releases it
+STOCK_RESERVATION_TTL = config('STOCK_RESERVATION_TTL', default=15 * 60, cast=int)
+# 'database' writes carts to Cart/CartItem on every change; 'redis' keeps them
+# in Redis hashes and writes them back in the background (orders.cart_store)
+CART_STORE = config('CART_STORE', default='database')
+CART_REDIS_URL = config('CART_REDIS_URL', default=CELERY_BROKER_URL)
+# Seconds an idle cart stays in Redis; it is reloaded from the database after
+CART_REDIS_TTL = config('CART_REDIS_TTL', default=60 * 60 * 24 * 30, cast=int)
+# Seconds a response is kept for replay under its Idempotency-Key
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=60 * 60 * 24, cast=int)
+# Seconds a retry waits for the in-flight request with the same key
+IDEMPOTENCY_LOCK_TIMEOUT = config('IDEMPOTENCY_LOCK_TIMEOUT', default=30, cast=int)
+# Seconds the in-flight claim on a key lasts; must outlive the slowest request
+# (gunicorn kills workers after 120s) so a retry never runs the view twice
+IDEMPOTENCY_CLAIM_TTL = config('IDEMPOTENCY_CLAIM_TTL', default=180, cast=int)
+
+# Sales analytics
+# Seconds the rollup watermark trails the clock, covering in-flight transactions
+ANALYTICS_ROLLUP_LAG = config('ANALYTICS_ROLLUP_LAG', default=60, cast=int)
+# Days recomputed per transaction by full runs and backfills
+ANALYTICS_ROLLUP_BATCH_DAYS = config('ANALYTICS_ROLLUP_BATCH_DAYS', default=31, cast=int)
+# Days the nightly run recomputes in full; older history only via backfill_sales_rollups
+ANALYTICS_ROLLUP_RECENT_DAYS = config('ANALYTICS_ROLLUP_RECENT_DAYS', default=7, cast=int)
 
 # Excel Import Settings
 MAX_EXCEL_FILE_SIZE = 10 * 1024 * 1024  # 10MB
@@ -34,6 +34,7 @@ urlpatterns = [
     path('api/orders/', include('orders.urls')),
     path('api/payments/', include('payments.urls')),
     path('api/excel-import/', include('excel_import.urls')),
+    path('api/analytics/', include('analytics.urls')),
 ]
 
 # Serve media files in development
@@ -2,9 +2,11 @@
 Admin configuration for products app
 """
 from django.contrib import admin
+from django.db import transaction
+from .cache import CATALOG, bump_cache_version
 from .models import (
     Category, Product, ProductImage, ProductAttribute,
-    ProductAttributeValue, ProductReview
+    ProductAttributeValue, ProductReview, RelatedProductsBuild
 )
 
 
@@ -59,6 +61,14 @@ class ProductAdmin(admin.ModelAdmin):
         }),
     )
 
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        # Write only the edited fields, so checkouts, stock holds and rating
+        # updates made since the form was loaded are not undone
+        fields = {field.name for field in obj._meta.concrete_fields}
+        obj.save(update_fields=[name for name in form.changed_data if name in fields])
+
 
 @admin.register(ProductImage)
 class ProductImageAdmin(admin.ModelAdmin):
@@ -88,12 +98,39 @@ class ProductReviewAdmin(admin.ModelAdmin):
     list_editable = ['is_approved']
     actions = ['approve_reviews', 'reject_reviews']
 
+    def _set_approval(self, queryset, is_approved):
+        """Bulk (un)approve reviews and refresh the affected products' ratings"""
+        with transaction.atomic():
+            changed = queryset.exclude(is_approved=is_approved)
+            product_ids = set(changed.values_list('product_id', flat=True))
+            count = changed.update(is_approved=is_approved)
+            Product.objects.filter(pk__in=product_ids).refresh_rating_aggregates()
+        # update() sends no signals
+        bump_cache_version(CATALOG)
+        return count
+
     def approve_reviews(self, request, queryset):
-        queryset.update(is_approved=True)
-        self.message_user(request, f'{queryset.count()} نظر تایید شد')
+        count = self._set_approval(queryset, True)
+        self.message_user(request, f'{count} نظر تایید شد')
     approve_reviews.short_description = 'تایید نظرات انتخاب شده'
 
     def reject_reviews(self, request, queryset):
-        queryset.update(is_approved=False)
-        self.message_user(request, f'{queryset.count()} نظر رد شد')
+        count = self._set_approval(queryset, False)
+        self.message_user(request, f'{count} نظر رد شد')
     reject_reviews.short_description = 'رد نظرات انتخاب شده'
+
+
+@admin.register(RelatedProductsBuild)
+class RelatedProductsBuildAdmin(admin.ModelAdmin):
+    list_display = [
+        'created_at', 'is_full', 'products_updated', 'orders_scanned',
+        'duration', 'orders_until'
+    ]
+    list_filter = ['is_full']
+    readonly_fields = [
+        'orders_until', 'is_full', 'products_updated', 'orders_scanned',
+        'duration', 'created_at'
+    ]
+
+    def has_add_permission(self, request):
+        return False
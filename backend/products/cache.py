@@ -0,0 +1,123 @@
+"""
+Cache helpers for products app
+"""
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+# Cache scopes; each has a version counter that is bumped on writes
+CATEGORY_TREE = 'category_tree'
+CATALOG = 'catalog'
+
+# Versioned entries never go stale, so they only expire to free memory
+VERSIONED_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Poll interval while another request rebuilds a response cache entry
+RESPONSE_CACHE_POLL_INTERVAL = 0.05
+
+_batch = threading.local()
+
+
+def _version_key(scope):
+    return f'version:{scope}'
+
+
+def get_cache_version(scope):
+    """Current version of a cache scope, used as part of its cache keys"""
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        # Start from a timestamp so an evicted counter never reuses old keys
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_cache_version(scope):
+    """Invalidate every entry of a cache scope"""
+    pending = getattr(_batch, 'scopes', None)
+    if pending is not None:
+        pending.add(scope)
+        return
+    try:
+        cache.incr(_version_key(scope))
+    except ValueError:
+        get_cache_version(scope)
+
+
+@contextmanager
+def batch_version_bumps():
+    """
+    Collapse the version bumps made inside the block into one per scope
+
+    Used by bulk writers (e.g. the Excel import) so saving thousands of rows
+    invalidates the cache once, when the block exits.
+    """
+    if getattr(_batch, 'scopes', None) is not None:
+        yield
+        return
+
+    _batch.scopes = set()
+    try:
+        yield
+    finally:
+        scopes, _batch.scopes = _batch.scopes, None
+        for scope in scopes:
+            bump_cache_version(scope)
+
+
+def response_cache_key(request, scope=CATALOG):
+    """Cache key for a request path and its normalized query string"""
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    digest = hashlib.md5(
+        f'{request.build_absolute_uri(request.path)}?{query}'.encode()
+    ).hexdigest()
+    return f'response:{scope}:{get_cache_version(scope)}:{digest}'
+
+
+def cache_response(scope=CATALOG):
+    """
+    Cache successful anonymous GET responses of a view method
+
+    Entries are keyed on the scope version, so bumping it invalidates them
+    all at once. On a miss one request rebuilds the entry under a lock while
+    concurrent misses wait for it instead of hitting the database too.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated:
+                return method(self, request, *args, **kwargs)
+
+            cache_key = response_cache_key(request, scope)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return Response(cached)
+
+            lock_key = f'{cache_key}:lock'
+            lock_timeout = settings.RESPONSE_CACHE_LOCK_TIMEOUT
+            locked = cache.add(lock_key, 1, lock_timeout)
+            if not locked:
+                deadline = time.monotonic() + lock_timeout
+                while time.monotonic() < deadline:
+                    time.sleep(RESPONSE_CACHE_POLL_INTERVAL)
+                    cached = cache.get(cache_key)
+                    if cached is not None:
+                        return Response(cached)
+
+            try:
+                response = method(self, request, *args, **kwargs)
+                if response.status_code == 200:
+                    cache.set(cache_key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+            finally:
+                if locked:
+                    cache.delete(lock_key)
+            return response
+        return wrapper
+    return decorator
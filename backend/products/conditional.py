@@ -0,0 +1,98 @@
+"""
+Conditional GET support for products app
+"""
+import hashlib
+from functools import wraps
+from django.db.models import Max, Q, Subquery
+from django.db.models.functions import Greatest
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from .cache import CATALOG, get_cache_version
+from .models import Category
+
+
+def conditional_response(last_modified_func):
+    """
+    Answer GET requests with 304 Not Modified when the client copy is current
+
+    last_modified_func(view, request, *args, **kwargs) returns the newest
+    ``updated_at`` behind the response (None when there is nothing to
+    validate). The weak ETag combines it with the catalog version, which
+    also changes on deletes, and the full request path, so every page and
+    filter combination validates separately. The check runs before the view
+    method, so a 304 costs only that lookup.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return method(self, request, *args, **kwargs)
+
+            last_modified = last_modified_func(self, request, *args, **kwargs)
+            if last_modified is None:
+                return method(self, request, *args, **kwargs)
+
+            digest = hashlib.md5('|'.join([
+                last_modified.isoformat(),
+                str(get_cache_version(CATALOG)),
+                request.get_full_path(),
+                request.accepted_media_type or '',
+            ]).encode()).hexdigest()
+            etag = f'W/"{digest}"'
+            timestamp = int(last_modified.timestamp())
+
+            not_modified = get_conditional_response(
+                request, etag=etag, last_modified=timestamp
+            )
+            if not_modified is not None:
+                return not_modified
+
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                response['ETag'] = etag
+                response['Last-Modified'] = http_date(timestamp)
+                # Let clients keep the payload but revalidate it every time
+                patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def _latest(queryset):
+    """
+    Newest product or category change behind a product queryset
+
+    Both maxima are plain MAX() aggregates, so PostgreSQL can answer them
+    from the updated_at indexes instead of scanning the products.
+    """
+    latest_category = Category.objects.order_by('-updated_at').values('updated_at')[:1]
+    return queryset.order_by().aggregate(
+        last_modified=Greatest(Max('updated_at'), Subquery(latest_category))
+    )['last_modified']
+
+
+def product_list_last_modified(view, request, *args, **kwargs):
+    return _latest(view.filter_queryset(view.get_queryset()))
+
+
+def product_last_modified(view, request, *args, **kwargs):
+    lookup = kwargs[view.lookup_url_kwarg or view.lookup_field]
+    return _latest(view.get_queryset().filter(**{view.lookup_field: lookup}))
+
+
+def category_tree_last_modified(view, request, *args, **kwargs):
+    return Category.objects.filter(is_active=True).aggregate(
+        last_modified=Max('updated_at')
+    )['last_modified']
+
+
+def category_products_last_modified(view, request, *args, **kwargs):
+    lookup = kwargs[view.lookup_url_kwarg or view.lookup_field]
+    return Category.objects.filter(
+        is_active=True, **{view.lookup_field: lookup}
+    ).aggregate(
+        last_modified=Greatest(
+            Max('updated_at'),
+            Max('products__updated_at', filter=Q(products__is_active=True)),
+        )
+    )['last_modified']
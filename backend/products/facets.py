@@ -0,0 +1,105 @@
+"""
+Faceted counts for the product catalog
+"""
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import BooleanField, Case, Count, F, IntegerField, Q, Value, When
+from .cache import CATALOG, get_cache_version
+from .utils import normalize_persian
+
+# Query parameters that change facet counts (see ProductViewSet.get_queryset)
+FACET_PARAMS = (
+    'category', 'is_featured', 'min_price', 'max_price', 'in_stock', 'on_sale', 'search'
+)
+
+
+def facets_cache_key(query_params):
+    """Cache key for a normalized combination of filter parameters"""
+    parts = []
+    for name in FACET_PARAMS:
+        value = query_params.get(name, '').strip()
+        if name == 'search':
+            value = normalize_persian(value).lower()
+        if value:
+            parts.append(f'{name}={value}')
+    digest = hashlib.md5('&'.join(parts).encode()).hexdigest()
+    return f'facets:{get_cache_version(CATALOG)}:{digest}'
+
+
+def _flag(condition):
+    return Case(When(condition, then=Value(True)), default=Value(False), output_field=BooleanField())
+
+
+def product_facets(queryset):
+    """
+    Category, price bucket, availability and sale counts for a queryset
+
+    Everything comes from one GROUP BY over (category, price bucket,
+    in stock, on sale); the facets are rolled up from those rows.
+    """
+    bounds = settings.FACET_PRICE_BUCKETS
+    price_bucket = Case(
+        *[When(effective_price__lt=bound, then=Value(index)) for index, bound in enumerate(bounds)],
+        default=Value(len(bounds)),
+        output_field=IntegerField(),
+    )
+    rows = (
+        queryset.order_by()
+        .annotate(
+            facet_price_bucket=price_bucket,
+            facet_in_stock=_flag(Q(stock_quantity__gt=0)),
+            facet_on_sale=F('on_sale'),
+        )
+        .values(
+            'category_id', 'category__name',
+            'facet_price_bucket', 'facet_in_stock', 'facet_on_sale',
+        )
+        .annotate(count=Count('id'))
+    )
+
+    total = in_stock = on_sale = 0
+    categories = {}
+    price_counts = [0] * (len(bounds) + 1)
+    for row in rows:
+        count = row['count']
+        total += count
+        price_counts[row['facet_price_bucket']] += count
+        if row['facet_in_stock']:
+            in_stock += count
+        if row['facet_on_sale']:
+            on_sale += count
+        if row['category_id'] is not None:
+            category = categories.setdefault(row['category_id'], {
+                'id': row['category_id'],
+                'name': row['category__name'],
+                'count': 0,
+            })
+            category['count'] += count
+
+    lower_bounds = [0, *bounds]
+    upper_bounds = [*bounds, None]
+    return {
+        'total': total,
+        'categories': sorted(categories.values(), key=lambda c: (-c['count'], c['name'])),
+        'price': [
+            {'min': low, 'max': high, 'count': count}
+            for low, high, count in zip(lower_bounds, upper_bounds, price_counts)
+        ],
+        'availability': {'in_stock': in_stock, 'out_of_stock': total - in_stock},
+        'on_sale': on_sale,
+    }
+
+
+def cached_product_facets(get_queryset, query_params):
+    """
+    product_facets() cached per filter combination and catalog version
+
+    get_queryset is only called on a cache miss.
+    """
+    cache_key = facets_cache_key(query_params)
+    facets = cache.get(cache_key)
+    if facets is None:
+        facets = product_facets(get_queryset())
+        cache.set(cache_key, facets, settings.FACETS_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,98 @@
+"""
+Resized image variants for products app
+"""
+import hashlib
+import posixpath
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# Output format -> (Pillow format, file extension)
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+
+def variant_name(name, width, extension, content):
+    """
+    Storage name of a variant: <dir>/variants/<stem>-<width>w-<hash>.<ext>
+
+    The hash is taken from the variant's own bytes, so a name is never
+    reused for different content and can be cached as immutable.
+    """
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    return posixpath.join(directory, 'variants', f'{stem}-{width}w-{digest}.{extension}')
+
+
+def variant_widths(original_width):
+    """Configured widths below the original; never upscales"""
+    widths = [w for w in settings.IMAGE_VARIANT_WIDTHS if w < original_width]
+    return widths or [original_width]
+
+
+def _encode(image, pillow_format):
+    buffer = BytesIO()
+    if pillow_format == 'JPEG' and image.mode != 'RGB':
+        # JPEG has no alpha channel; flatten onto white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        image = background
+    image.save(
+        buffer, pillow_format,
+        quality=settings.IMAGE_VARIANT_QUALITY, optimize=True
+    )
+    return buffer.getvalue()
+
+
+def build_variants(file):
+    """
+    Write fixed-width WebP and JPEG copies of a stored image
+
+    Returns ``{format: {width: storage name}}`` for the variants field.
+    A variant whose file already exists (same source, same settings) is
+    not written again.
+    """
+    storage = file.storage
+    with storage.open(file.name, 'rb') as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        image.load()
+
+    variants = {fmt: {} for fmt in VARIANT_FORMATS}
+    for width in variant_widths(image.width):
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS)
+        for fmt, (pillow_format, extension) in VARIANT_FORMATS.items():
+            content = _encode(resized, pillow_format)
+            name = variant_name(file.name, width, extension, content)
+            if not storage.exists(name):
+                name = storage.save(name, ContentFile(content))
+            variants[fmt][str(width)] = name
+    return variants
+
+
+def delete_stale_variants(storage, old, new):
+    """Delete the files of an ``old`` variants map that ``new`` no longer uses"""
+    keep = {name for names in (new or {}).values() for name in names.values()}
+    for names in (old or {}).values():
+        for name in names.values():
+            if name not in keep and storage.exists(name):
+                storage.delete(name)
+
+
+def srcset(variants, url):
+    """``{format: "url 160w, url 320w"}`` for a variants map; url(name) builds each URL"""
+    return {
+        fmt: ', '.join(
+            f'{url(names[width])} {width}w'
+            for width in sorted(names, key=int)
+        )
+        for fmt, names in (variants or {}).items() if names
+    }
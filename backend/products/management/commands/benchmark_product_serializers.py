@@ -0,0 +1,147 @@
+"""
+Management command to compare product list serialization costs
+"""
+
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from products.models import Category, Product
+from products.serializers import ProductListSerializer, ProductListValues
+
+
+class Rollback(Exception):
+    """Raised to discard the seeded products"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark ProductListSerializer against the values()-based '
+        'ProductListValues on the same products'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=1000,
+            help='Number of products per run (default: 1000)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Runs per serializer; the fastest one is reported (default: 5)',
+        )
+        parser.add_argument(
+            '--fields',
+            help='Comma separated ?fields= subset to benchmark as well',
+        )
+        parser.add_argument(
+            '--seed',
+            action='store_true',
+            help='Benchmark on generated products inside a rolled back transaction',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if options['seed']:
+                    self.seed(options['rows'])
+                with override_settings(ALLOWED_HOSTS=['testserver']):
+                    self.benchmark(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count):
+        category = Category.objects.create(name='benchmark', slug='benchmark')
+        Product.objects.bulk_create([
+            Product(
+                name=f'benchmark product {i}',
+                slug=f'benchmark-product-{i}',
+                sku=f'BENCHMARK-{i}',
+                category=category,
+                price=10000 + i,
+                sale_price=9000 + i if i % 3 == 0 else None,
+                stock_quantity=i % 5,
+                primary_image=f'products/benchmark-{i}.jpg',
+            )
+            for i in range(count)
+        ], batch_size=1000)
+
+    def benchmark(self, options):
+        rows = options['rows']
+        queryset = Product.objects.filter(is_active=True).select_related('category')[:rows]
+        request = Request(APIRequestFactory().get('/api/products/products/'))
+
+        instances = list(queryset)
+        if not instances:
+            raise CommandError('No active products; run with --seed')
+        count = len(instances)
+
+        self.compare(
+            'all fields', queryset, request, instances, None, count, options['repeat']
+        )
+        if options['fields']:
+            fields = [
+                name for name in ProductListSerializer.Meta.fields
+                if name in options['fields'].split(',')
+            ]
+            self.compare(
+                ','.join(fields), queryset, request, instances, fields, count,
+                options['repeat']
+            )
+
+    def compare(self, label, queryset, request, instances, fields, count, repeat):
+        values = ProductListValues(fields=fields, context={'request': request})
+        value_rows = list(queryset.values(*values.get_columns()))
+
+        def serializer_output():
+            data = ProductListSerializer(
+                instances, many=True, context={'request': request}
+            ).data
+            if fields:
+                data = [{name: row[name] for name in fields if name in row} for row in data]
+            return data
+
+        def values_output():
+            return ProductListValues(
+                fields=fields, context={'request': request}
+            ).serialize(value_rows)
+
+        expected = json.loads(JSONRenderer().render(serializer_output()))
+        actual = json.loads(JSONRenderer().render(values_output()))
+        if expected != actual:
+            raise CommandError(f'{label}: ProductListValues output differs')
+
+        serializer_time = self.best_of(serializer_output, repeat)
+        values_time = self.best_of(values_output, repeat)
+        fetch_instances = self.best_of(lambda: list(queryset.all()), repeat)
+        fetch_values = self.best_of(
+            lambda: list(queryset.values(*values.get_columns())), repeat
+        )
+
+        self.stdout.write(self.style.SUCCESS(f'\n{label} ({count} rows, best of {repeat})'))
+        self.stdout.write(
+            f'  serialize  ProductListSerializer {serializer_time / count * 1e6:8.1f} us/row'
+            f'   ProductListValues {values_time / count * 1e6:8.1f} us/row'
+            f'   {serializer_time / values_time:5.1f}x'
+        )
+        self.stdout.write(
+            f'  fetch      model instances       {fetch_instances / count * 1e6:8.1f} us/row'
+            f'   values()          {fetch_values / count * 1e6:8.1f} us/row'
+            f'   {fetch_instances / fetch_values:5.1f}x'
+        )
+
+    def best_of(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
@@ -0,0 +1,27 @@
+"""
+Management command to build co-purchase related products
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from products.related import build_related_products
+
+
+class Command(BaseCommand):
+    help = 'Build related products from order history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Recompute every product instead of those in recently changed orders',
+        )
+
+    def handle(self, *args, **options):
+        build = build_related_products(full=options['full'])
+        if build is None:
+            raise CommandError('Another related products build is running; try again later')
+        kind = 'Full' if build.is_full else 'Incremental'
+        self.stdout.write(self.style.SUCCESS(
+            f'{kind} build: {build.products_updated} products updated, '
+            f'{build.orders_scanned} orders scanned in {build.duration}s'
+        ))
@@ -0,0 +1,157 @@
+"""
+Management command to check that catalog queries use indexes
+"""
+
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from products.models import Category, Product, RelatedProduct
+
+# Tables whose scans must go through an index
+CHECKED_TABLES = {'products', 'related_products'}
+
+
+class Rollback(Exception):
+    """Raised to discard the seeded catalog"""
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a large catalog in a rolled back transaction and EXPLAIN the '
+        'storefront queries, failing if any of them scans products sequentially'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--products',
+            type=int,
+            default=20000,
+            help='Number of products to seed (default: 20000)',
+        )
+        parser.add_argument(
+            '--categories',
+            type=int,
+            default=40,
+            help='Number of categories to seed (default: 40)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Query plans can only be checked on PostgreSQL')
+
+        self.failures = []
+        try:
+            with transaction.atomic():
+                slugs = self.seed(options['products'], options['categories'])
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE products')
+                    cursor.execute('ANALYZE related_products')
+                    cursor.execute('ANALYZE categories')
+                self.check_endpoints(slugs)
+                raise Rollback
+        except Rollback:
+            pass
+
+        if self.failures:
+            raise CommandError(
+                f'{len(self.failures)} quer(ies) scan a table sequentially:\n'
+                + '\n\n'.join(self.failures)
+            )
+        self.stdout.write(self.style.SUCCESS('All catalog queries use indexes'))
+
+    def seed(self, product_count, category_count):
+        """Bulk insert a catalog shaped like production data"""
+        self.stdout.write(f'Seeding {product_count} products...')
+        categories = Category.objects.bulk_create([
+            Category(name=f'plan-check {i}', slug=f'plan-check-{i}', is_active=True)
+            for i in range(category_count)
+        ])
+        products = Product.objects.bulk_create([
+            Product(
+                name=f'plan-check product {i}',
+                slug=f'plan-check-product-{i}',
+                sku=f'PLAN-CHECK-{i}',
+                category=categories[i % category_count],
+                price=10000 + (i % 500) * 1000,
+                sale_price=9000 + (i % 500) * 1000 if i % 20 == 0 else None,
+                stock_quantity=i % 7,
+                # A small active storefront (10%) inside a larger archive
+                is_active=i % 10 == 0,
+                is_featured=i % 100 == 0,
+            )
+            for i in range(product_count)
+        ], batch_size=2000)
+        # created_at/updated_at are auto fields; spread them over time
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE products SET created_at = now() - (id || ' minutes')::interval, "
+                "updated_at = now() - (id || ' minutes')::interval "
+                "WHERE sku LIKE 'PLAN-CHECK-%%'"
+            )
+        RelatedProduct.objects.bulk_create([
+            RelatedProduct(
+                product=product,
+                related=products[(index + offset) % len(products)],
+                score=1 / offset,
+                rank=offset,
+            )
+            for index, product in enumerate(products[:2000])
+            for offset in range(1, 7)
+        ], batch_size=2000)
+
+        product = next(p for p in products if p.is_active)
+        # Its category is sure to hold active products
+        return {'product': product.slug, 'category': product.category.slug}
+
+    def check_endpoints(self, slugs):
+        base = '/api/products'
+        endpoints = {
+            'list': f'{base}/products/?pagination=cursor',
+            'list by price': f'{base}/products/?ordering=price&pagination=cursor',
+            'list in stock': f'{base}/products/?in_stock=true&pagination=cursor',
+            'list by category': (
+                f'{base}/products/?category={Category.objects.get(slug=slugs["category"]).pk}'
+                '&pagination=cursor'
+            ),
+            'price range': f'{base}/products/?min_price=20000&max_price=25000&ordering=price&pagination=cursor',
+            'featured': f'{base}/products/featured/',
+            'on_sale': f'{base}/products/on_sale/',
+            'detail': f'{base}/products/{slugs["product"]}/',
+            'related': f'{base}/products/{slugs["product"]}/related/',
+            'category products': f'{base}/categories/{slugs["category"]}/products/',
+        }
+
+        client = Client()
+        dummy_cache = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(CACHES=dummy_cache, ALLOWED_HOSTS=['testserver']):
+            for name, url in endpoints.items():
+                with CaptureQueriesContext(connection) as context:
+                    response = client.get(url)
+                if response.status_code != 200:
+                    raise CommandError(f'{name}: {url} returned {response.status_code}')
+                self.check_queries(name, context.captured_queries)
+
+    def check_queries(self, name, queries):
+        checked = 0
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or 'COUNT(' in sql:
+                    continue
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                for node in plan_nodes(plan[0]['Plan']):
+                    if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in CHECKED_TABLES:
+                        self.failures.append(f'[{name}] Seq Scan on {node["Relation Name"]}\n{sql}')
+                checked += 1
+        self.stdout.write(f'  {name}: {checked} queries checked')
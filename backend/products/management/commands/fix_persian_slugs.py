@@ -3,8 +3,16 @@ Management command to fix Persian slugs in products and categories
 """
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from products.cache import CATALOG, CATEGORY_TREE, bump_cache_version
 from products.models import Product, Category
-from products.utils import generate_unique_slug
+from products.utils import SlugAllocator
+
+
+def needs_new_slug(slug):
+    """Empty slugs and slugs with Persian (non-ASCII) characters"""
+    return not slug or any(ord(char) > 127 for char in slug)
 
 
 class Command(BaseCommand):
@@ -16,6 +24,12 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be changed without actually changing it',
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows read and updated per batch (default: 1000)',
+        )
 
     def handle(self, *args, **options):
         dry_run = options['dry_run']
@@ -23,34 +37,14 @@ class Command(BaseCommand):
         if dry_run:
             self.stdout.write(self.style.WARNING('DRY RUN MODE - No changes will be saved'))
 
+        batch_size = options['batch_size']
+
         # Fix Category slugs
         self.stdout.write('\n' + '='*60)
         self.stdout.write(self.style.SUCCESS('Fixing Category slugs...'))
         self.stdout.write('='*60 + '\n')
 
-        categories = Category.objects.all()
-        category_count = 0
-
-        for category in categories:
-            old_slug = category.slug
-            # Check if slug contains Persian characters
-            has_persian = any(ord(char) > 127 for char in old_slug)
-
-            if has_persian or not old_slug:
-                new_slug = generate_unique_slug(Category, category.name, category)
-
-                if old_slug != new_slug:
-                    self.stdout.write(
-                        f'Category: {category.name}\n'
-                        f'  Old slug: {old_slug}\n'
-                        f'  New slug: {new_slug}'
-                    )
-
-                    if not dry_run:
-                        category.slug = new_slug
-                        category.save()
-
-                    category_count += 1
+        category_count = self.fix_slugs(Category, batch_size, dry_run)
 
         self.stdout.write(
             self.style.SUCCESS(f'\n✓ Fixed {category_count} category slugs')
@@ -61,34 +55,19 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS('Fixing Product slugs...'))
         self.stdout.write('='*60 + '\n')
 
-        products = Product.objects.all()
-        product_count = 0
-
-        for product in products:
-            old_slug = product.slug
-            # Check if slug contains Persian characters
-            has_persian = any(ord(char) > 127 for char in old_slug)
-
-            if has_persian or not old_slug:
-                new_slug = generate_unique_slug(Product, product.name, product)
-
-                if old_slug != new_slug:
-                    self.stdout.write(
-                        f'Product: {product.name}\n'
-                        f'  Old slug: {old_slug}\n'
-                        f'  New slug: {new_slug}'
-                    )
-
-                    if not dry_run:
-                        product.slug = new_slug
-                        product.save()
-
-                    product_count += 1
+        product_count = self.fix_slugs(Product, batch_size, dry_run)
 
         self.stdout.write(
             self.style.SUCCESS(f'\n✓ Fixed {product_count} product slugs')
         )
 
+        if not dry_run:
+            # bulk_update sends no signals; invalidate the cached responses here
+            if category_count:
+                bump_cache_version(CATEGORY_TREE)
+            if category_count or product_count:
+                bump_cache_version(CATALOG)
+
         # Summary
         self.stdout.write('\n' + '='*60)
         self.stdout.write(self.style.SUCCESS('SUMMARY'))
@@ -102,3 +81,45 @@ class Command(BaseCommand):
             self.stdout.write('Run without --dry-run to apply changes.')
         else:
             self.stdout.write(self.style.SUCCESS('\n✓ All slugs have been fixed!'))
+
+    def fix_slugs(self, model, batch_size, dry_run):
+        """Re-slug the model's rows in chunks; returns the number changed"""
+        allocator = SlugAllocator(model)
+        label = model._meta.object_name
+        count = 0
+
+        rows = model.objects.only('pk', 'name', 'slug').order_by('pk').iterator(
+            chunk_size=batch_size
+        )
+        batch = []
+        for row in rows:
+            if needs_new_slug(row.slug):
+                batch.append(row)
+            if len(batch) >= batch_size:
+                count += self.fix_batch(allocator, label, batch, dry_run)
+                batch = []
+        if batch:
+            count += self.fix_batch(allocator, label, batch, dry_run)
+        return count
+
+    def fix_batch(self, allocator, label, batch, dry_run):
+        changed = []
+        now = timezone.now()
+        for row, new_slug in zip(batch, allocator.allocate(row.name for row in batch)):
+            if row.slug == new_slug:
+                continue
+            self.stdout.write(
+                f'{label}: {row.name}\n'
+                f'  Old slug: {row.slug}\n'
+                f'  New slug: {new_slug}'
+            )
+            row.slug = new_slug
+            row.updated_at = now
+            changed.append(row)
+
+        if changed and not dry_run:
+            with transaction.atomic():
+                type(changed[0]).objects.bulk_update(
+                    changed, ['slug', 'updated_at'], batch_size=len(changed)
+                )
+        return len(changed)
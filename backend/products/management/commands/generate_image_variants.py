@@ -0,0 +1,75 @@
+"""
+Management command to backfill resized image variants
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.core.management.base import BaseCommand
+from django.db import connection
+from products.models import Category, ProductImage
+from products.tasks import generate_image_variants_batch
+
+
+def run_batch(model_label, pks):
+    try:
+        return generate_image_variants_batch(model_label, pks)
+    finally:
+        # Each worker thread has its own database connection
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Generate WebP/JPEG variants for existing product and category images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate variants for images that already have them',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Images per batch (default: 50)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Batches processed in parallel (default: 4)',
+        )
+        parser.add_argument(
+            '--celery',
+            action='store_true',
+            help='Queue the batches on Celery instead of processing them here',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        batches = []
+        for model in (ProductImage, Category):
+            queryset = model.objects.exclude(image='').exclude(image__isnull=True)
+            if not options['force']:
+                queryset = queryset.filter(image_variants={})
+            pks = list(queryset.order_by('pk').values_list('pk', flat=True))
+            self.stdout.write(f'{model._meta.label}: {len(pks)} images')
+            batches += [
+                (model._meta.label, pks[i:i + batch_size])
+                for i in range(0, len(pks), batch_size)
+            ]
+
+        if not batches:
+            self.stdout.write(self.style.SUCCESS('Nothing to do'))
+            return
+
+        if options['celery']:
+            for model_label, pks in batches:
+                generate_image_variants_batch.delay(model_label, pks)
+            self.stdout.write(self.style.SUCCESS(f'Queued {len(batches)} batches'))
+            return
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [executor.submit(run_batch, *batch) for batch in batches]
+            for future in as_completed(futures):
+                self.stdout.write(future.result())
+        self.stdout.write(self.style.SUCCESS(f'Processed {len(batches)} batches'))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:36
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_primary_images(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    ProductImage = apps.get_model("products", "ProductImage")
+    primary = ProductImage.objects.filter(
+        product=OuterRef("pk"), is_primary=True
+    ).values("image")[:1]
+    Product.objects.update(primary_image=Subquery(primary))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0002_alter_product_low_stock_threshold"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="primary_image",
+            field=models.ImageField(
+                blank=True, editable=False, null=True, upload_to="products/"
+            ),
+        ),
+        migrations.RunPython(copy_primary_images, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:38
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import F, Func, TextField, Value
+
+# Frozen copy of products.search.normalized() as of this migration:
+# Arabic letter forms and digits folded, ZWNJ to space, diacritics dropped
+TRANSLATE_FROM = (
+    "\u064a\u0649\u0643\u0629\u06c0\u0623\u0625\u0671\u200c"
+    "\u06f0\u06f1\u06f2\u06f3\u06f4\u06f5\u06f6\u06f7\u06f8\u06f9"
+    "\u0660\u0661\u0662\u0663\u0664\u0665\u0666\u0667\u0668\u0669"
+    "\u064b\u064c\u064d\u064e\u064f\u0650\u0651\u0652\u0640"
+)
+TRANSLATE_TO = "\u06cc\u06cc\u06a9\u0647\u0647\u0627\u0627\u0627 01234567890123456789"
+
+
+def search_vector():
+    def part(field, weight):
+        normalized = Func(
+            F(field),
+            Value(TRANSLATE_FROM),
+            Value(TRANSLATE_TO),
+            function="translate",
+            output_field=TextField(),
+        )
+        return SearchVector(normalized, weight=weight, config="simple")
+
+    return (
+        part("name", "A")
+        + part("sku", "A")
+        + part("short_description", "B")
+        + part("description", "C")
+    )
+
+
+def build_search_vectors(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    Product.objects.update(search_vector=search_vector())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0003_product_primary_image"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="products_search_gin"
+            ),
+        ),
+        migrations.RunPython(build_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:39
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def count_sales(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    OrderItem = apps.get_model("orders", "OrderItem")
+    sold = (
+        OrderItem.objects.filter(product=OuterRef("pk"))
+        .exclude(order__status__in=["cancelled", "refunded"])
+        .values("product")
+        .annotate(total=Sum("quantity"))
+        .values("total")
+    )
+    Product.objects.update(sales_count=Coalesce(Subquery(sold), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0004_product_search_vector"),
+        ("orders", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="sales_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="تعداد فروش (برای رتبه\u200cبندی جستجو)",
+            ),
+        ),
+        migrations.RunPython(count_sales, migrations.RunPython.noop),
+    ]
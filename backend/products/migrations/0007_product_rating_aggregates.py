@@ -0,0 +1,81 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:40
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, FloatField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def aggregate_ratings(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    ProductReview = apps.get_model("products", "ProductReview")
+    approved = (
+        ProductReview.objects.filter(product=OuterRef("pk"), is_approved=True)
+        .order_by()
+        .values("product")
+    )
+
+    def aggregate(expression, output_field):
+        return Coalesce(
+            Subquery(approved.annotate(value=expression).values("value")),
+            Value(0),
+            output_field=output_field,
+        )
+
+    Product.objects.update(
+        rating_count=aggregate(Count("pk"), models.IntegerField()),
+        rating_avg=aggregate(Avg("rating"), FloatField()),
+        **{
+            f"rating_{r}_count": aggregate(
+                Count("pk", filter=Q(rating=r)), models.IntegerField()
+            )
+            for r in range(1, 6)
+        },
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0006_name_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rating_1_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_2_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_3_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_4_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_5_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_avg",
+            field=models.DecimalField(
+                decimal_places=2, default=0, editable=False, max_digits=3
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(aggregate_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0007_product_rating_aggregates"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RelatedProductsBuild",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "orders_until",
+                    models.DateTimeField(
+                        help_text="سفارش\u200cهای تغییر یافته تا این زمان در محاسبه لحاظ شده\u200cاند"
+                    ),
+                ),
+                ("is_full", models.BooleanField(default=False)),
+                ("products_updated", models.PositiveIntegerField(default=0)),
+                ("orders_scanned", models.PositiveIntegerField(default=0)),
+                ("duration", models.FloatField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "محاسبه محصولات مرتبط",
+                "verbose_name_plural": "محاسبات محصولات مرتبط",
+                "db_table": "related_products_builds",
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.CreateModel(
+            name="RelatedProduct",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("score", models.FloatField()),
+                ("rank", models.PositiveSmallIntegerField()),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="related_products",
+                        to="products.product",
+                    ),
+                ),
+                (
+                    "related",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="related_to",
+                        to="products.product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "محصول مرتبط",
+                "verbose_name_plural": "محصولات مرتبط",
+                "db_table": "related_products",
+                "ordering": ["product", "rank"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("product", "rank"), name="related_products_product_rank"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0008_related_products"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="effective_price",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=models.Case(
+                    models.When(
+                        models.Q(
+                            ("sale_price__gt", 0), ("sale_price__lt", models.F("price"))
+                        ),
+                        then=models.F("sale_price"),
+                    ),
+                    default=models.F("price"),
+                ),
+                output_field=models.DecimalField(decimal_places=0, max_digits=12),
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="on_sale",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=models.Case(
+                    models.When(
+                        models.Q(
+                            ("sale_price__gt", 0), ("sale_price__lt", models.F("price"))
+                        ),
+                        then=models.Value(True),
+                    ),
+                    default=models.Value(False),
+                ),
+                output_field=models.BooleanField(),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["is_active", "effective_price"], name="products_active_price"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "is_active", "effective_price"],
+                name="products_category_price",
+            ),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0009_product_effective_price"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="product",
+            name="products_sku_fe2039_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="products_slug_5e91f2_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="products_created_a77fb9_idx",
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["-created_at", "-id"],
+                name="products_active_recent",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["category", "-created_at", "-id"],
+                name="products_category_recent",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("is_active", True), ("is_featured", True)),
+                fields=["-created_at"],
+                name="products_featured_recent",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("is_active", True), ("on_sale", True)),
+                fields=["-created_at"],
+                name="products_on_sale_recent",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("is_active", True), ("stock_quantity__gt", 0)),
+                fields=["-created_at"],
+                name="products_in_stock_recent",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["-updated_at"],
+                name="products_active_updated",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0011_image_variants"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="reserved_quantity",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="تعداد رزرو شده برای سفارش\u200cهای در انتظار پرداخت",
+            ),
+        ),
+    ]
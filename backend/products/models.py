@@ -2,18 +2,59 @@
 Models for products app
 """
 
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import (
+    DEFERRED, Avg, Case, Count, DecimalField, F, FloatField, OuterRef, Q, Subquery,
+    Value, When
+)
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.utils import timezone
 from django.utils.text import slugify
+from .search import normalized, product_search_vector, product_search_vector_for
 from .utils import generate_unique_slug
 
 
-class Category(models.Model):
+class ImageVariantsMixin:
+    """
+    Clears image_variants when the stored image is replaced
+
+    The resized copies themselves are written asynchronously by
+    products.tasks.generate_image_variants.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_image_name = instance.__dict__.get("image", DEFERRED)
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._loaded_image_name = self.__dict__.get("image", DEFERRED)
+
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, "_loaded_image_name", None)
+        loaded = getattr(loaded, "name", loaded)
+        if loaded is not DEFERRED and (self.image.name or "") != (loaded or ""):
+            self.image_variants = {}
+        super().save(*args, **kwargs)
+        self._loaded_image_name = self.image.name
+
+    def needs_variants(self):
+        return bool(self.image) and not self.image_variants
+
+
+class Category(ImageVariantsMixin, models.Model):
     """Product Category"""
 
     name = models.CharField(max_length=200, unique=True)
     slug = models.SlugField(max_length=200, unique=True, blank=True)
     description = models.TextField(blank=True, null=True)
     image = models.ImageField(upload_to="categories/", blank=True, null=True)
+    # {format: {width: storage name}} of resized copies of image
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     parent = models.ForeignKey(
         "self", on_delete=models.CASCADE, null=True, blank=True, related_name="children"
     )
@@ -26,6 +67,12 @@ class Category(models.Model):
         verbose_name = "دسته‌بندی"
         verbose_name_plural = "دسته‌بندی‌ها"
         ordering = ["name"]
+        indexes = [
+            GinIndex(
+                OpClass(normalized(F("name")), name="gin_trgm_ops"),
+                name="categories_name_trgm",
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -36,6 +83,66 @@ class Category(models.Model):
         super().save(*args, **kwargs)
 
 
+RATINGS = range(1, 6)
+
+# A sale price only applies when it undercuts the list price (see is_on_sale)
+ON_SALE = Q(sale_price__gt=0, sale_price__lt=F("price"))
+
+
+class ProductQuerySet(models.QuerySet):
+    def update_search_vector(self):
+        """Recompute search_vector in SQL, for writes that bypass save()"""
+        return self.update(search_vector=product_search_vector())
+
+    def apply_rating(self, rating, delta):
+        """
+        Add (delta=1) or remove (delta=-1) one approved rating
+
+        The average is derived from the pre-update histogram in the same
+        UPDATE, so concurrent reviews never read-modify-write.
+        """
+        count = F("rating_count") + delta
+        total = sum(F(f"rating_{r}_count") * r for r in RATINGS) + rating * delta
+        return self.update(
+            rating_count=count,
+            rating_avg=Coalesce(
+                Cast(total, DecimalField(max_digits=14, decimal_places=4))
+                / NullIf(count, 0),
+                Value(0),
+                output_field=DecimalField(max_digits=3, decimal_places=2),
+            ),
+            updated_at=timezone.now(),
+            **{f"rating_{rating}_count": F(f"rating_{rating}_count") + delta},
+        )
+
+    def refresh_rating_aggregates(self):
+        """Recompute rating aggregates from approved reviews, for bulk writes"""
+        approved = (
+            ProductReview.objects.filter(product=OuterRef("pk"), is_approved=True)
+            .order_by()
+            .values("product")
+        )
+
+        def aggregate(expression, output_field):
+            return Coalesce(
+                Subquery(approved.annotate(value=expression).values("value")),
+                Value(0),
+                output_field=output_field,
+            )
+
+        return self.update(
+            rating_count=aggregate(Count("pk"), models.IntegerField()),
+            rating_avg=aggregate(Avg("rating"), FloatField()),
+            updated_at=timezone.now(),
+            **{
+                f"rating_{r}_count": aggregate(
+                    Count("pk", filter=Q(rating=r)), models.IntegerField()
+                )
+                for r in RATINGS
+            },
+        )
+
+
 class Product(models.Model):
     """Product Model"""
 
@@ -62,9 +169,35 @@ class Product(models.Model):
         help_text="قیمت تخفیف‌خورده",
     )
 
+    # Price customers pay and whether a discount applies, computed by the
+    # database so filters, sorts and indexes agree with final_price
+    effective_price = models.GeneratedField(
+        expression=Case(
+            When(ON_SALE, then=F("sale_price")),
+            default=F("price"),
+        ),
+        output_field=models.DecimalField(max_digits=12, decimal_places=0),
+        db_persist=True,
+    )
+    on_sale = models.GeneratedField(
+        expression=Case(
+            When(ON_SALE, then=Value(True)),
+            default=Value(False),
+        ),
+        output_field=models.BooleanField(),
+        db_persist=True,
+    )
+
     # Inventory
     stock_quantity = models.IntegerField(default=0, help_text="تعداد موجودی در انبار")
     low_stock_threshold = models.IntegerField(default=1)
+    sales_count = models.PositiveIntegerField(
+        default=0, editable=False, help_text="تعداد فروش (برای رتبه‌بندی جستجو)"
+    )
+    # Sum of the active StockReservation holds, kept in step by orders.services
+    reserved_quantity = models.PositiveIntegerField(
+        default=0, editable=False, help_text="تعداد رزرو شده برای سفارش‌های در انتظار پرداخت"
+    )
 
     # Product details
     unit = models.CharField(max_length=50, default="عدد", help_text="واحد محصول")
@@ -76,6 +209,28 @@ class Product(models.Model):
     is_active = models.BooleanField(default=True)
     is_featured = models.BooleanField(default=False)
 
+    # Denormalized copy of the primary ProductImage, kept in sync by ProductImage
+    primary_image = models.ImageField(
+        upload_to="products/", blank=True, null=True, editable=False
+    )
+    primary_image_variants = models.JSONField(
+        default=dict, blank=True, editable=False
+    )
+
+    # Normalized full-text document, written on save()
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # Approved review aggregates, maintained by ProductReview
+    rating_avg = models.DecimalField(
+        max_digits=3, decimal_places=2, default=0, editable=False
+    )
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
+
     # SEO
     meta_title = models.CharField(max_length=200, blank=True, null=True)
     meta_description = models.CharField(max_length=500, blank=True, null=True)
@@ -84,15 +239,60 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         db_table = "products"
         verbose_name = "محصول"
         verbose_name_plural = "محصولات"
         ordering = ["-created_at"]
         indexes = [
-            models.Index(fields=["sku"]),
-            models.Index(fields=["slug"]),
-            models.Index(fields=["-created_at"]),
+            # Listing shapes: every storefront query filters is_active and
+            # sorts by -created_at (sku and slug are covered by their
+            # unique constraints)
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=Q(is_active=True),
+                name="products_active_recent",
+            ),
+            models.Index(
+                fields=["category", "-created_at", "-id"],
+                condition=Q(is_active=True),
+                name="products_category_recent",
+            ),
+            models.Index(
+                fields=["-created_at"],
+                condition=Q(is_active=True, is_featured=True),
+                name="products_featured_recent",
+            ),
+            models.Index(
+                fields=["-created_at"],
+                condition=Q(is_active=True, on_sale=True),
+                name="products_on_sale_recent",
+            ),
+            models.Index(
+                fields=["-created_at"],
+                condition=Q(is_active=True, stock_quantity__gt=0),
+                name="products_in_stock_recent",
+            ),
+            # MAX(updated_at) for conditional GETs
+            models.Index(
+                fields=["-updated_at"],
+                condition=Q(is_active=True),
+                name="products_active_updated",
+            ),
+            models.Index(
+                fields=["is_active", "effective_price"], name="products_active_price"
+            ),
+            models.Index(
+                fields=["category", "is_active", "effective_price"],
+                name="products_category_price",
+            ),
+            GinIndex(fields=["search_vector"], name="products_search_gin"),
+            GinIndex(
+                OpClass(normalized(F("name")), name="gin_trgm_ops"),
+                name="products_name_trgm",
+            ),
         ]
 
     def __str__(self):
@@ -101,6 +301,12 @@ class Product(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = generate_unique_slug(Product, self.name, self)
+        self.search_vector = product_search_vector_for(self)
+        if kwargs.get("update_fields") is not None:
+            # Derived columns follow whichever fields were edited
+            kwargs["update_fields"] = {
+                *kwargs["update_fields"], "slug", "search_vector", "updated_at"
+            }
         super().save(*args, **kwargs)
 
     @property
@@ -117,6 +323,10 @@ class Product(models.Model):
             return int(((self.price - self.sale_price) / self.price) * 100)
         return 0
 
+    @property
+    def available_quantity(self):
+        return self.stock_quantity - self.reserved_quantity
+
     @property
     def is_in_stock(self):
         return self.stock_quantity > 0
@@ -125,14 +335,20 @@ class Product(models.Model):
     def is_low_stock(self):
         return 0 < self.stock_quantity <= self.low_stock_threshold
 
+    @property
+    def rating_histogram(self):
+        return {r: getattr(self, f"rating_{r}_count") for r in RATINGS}
+
 
-class ProductImage(models.Model):
+class ProductImage(ImageVariantsMixin, models.Model):
     """Product Images"""
 
     product = models.ForeignKey(
         Product, on_delete=models.CASCADE, related_name="images"
     )
     image = models.ImageField(upload_to="products/")
+    # {format: {width: storage name}} of resized copies of image
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     alt_text = models.CharField(max_length=200, blank=True, null=True)
     is_primary = models.BooleanField(default=False)
     order = models.IntegerField(default=0)
@@ -150,10 +366,24 @@ class ProductImage(models.Model):
     def save(self, *args, **kwargs):
         if self.is_primary:
             # Remove primary from other images of same product
-            ProductImage.objects.filter(product=self.product, is_primary=True).update(
-                is_primary=False
-            )
+            ProductImage.objects.filter(
+                product_id=self.product_id, is_primary=True
+            ).exclude(pk=self.pk).update(is_primary=False)
         super().save(*args, **kwargs)
+        self.sync_product_primary_image(self.product_id)
+
+    @staticmethod
+    def sync_product_primary_image(product_id):
+        """Copy the current primary image and its variants onto Product"""
+        primary = ProductImage.objects.filter(product=OuterRef("pk"), is_primary=True)
+        Product.objects.filter(pk=product_id).update(
+            primary_image=Subquery(primary.values("image")[:1]),
+            primary_image_variants=Coalesce(
+                Subquery(primary.values("image_variants")[:1]),
+                Value({}, output_field=models.JSONField()),
+            ),
+            updated_at=timezone.now(),
+        )
 
 
 class ProductAttribute(models.Model):
@@ -211,3 +441,87 @@ class ProductReview(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.product.name} - {self.rating}★"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._counted_rating = instance._current_rating()
+        return instance
+
+    def _current_rating(self):
+        """(product_id, rating) if this review counts towards the aggregates"""
+        if self.__dict__.get("is_approved"):
+            return self.product_id, self.rating
+        return None
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        counted = self._current_rating()
+        previous = getattr(self, "_counted_rating", None)
+        if counted != previous:
+            if previous:
+                Product.objects.filter(pk=previous[0]).apply_rating(previous[1], -1)
+            if counted:
+                Product.objects.filter(pk=counted[0]).apply_rating(counted[1], 1)
+        self._counted_rating = counted
+
+    def uncount_rating(self):
+        """Take a deleted review out of its product's aggregates"""
+        previous = getattr(self, "_counted_rating", None)
+        if previous:
+            Product.objects.filter(pk=previous[0]).apply_rating(previous[1], -1)
+
+
+class RelatedProduct(models.Model):
+    """
+    Top-K co-purchased neighbours of a product
+
+    Built offline from order history by products.related; rank 1 is the
+    strongest neighbour.
+    """
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="related_products"
+    )
+    related = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="related_to"
+    )
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        db_table = "related_products"
+        verbose_name = "محصول مرتبط"
+        verbose_name_plural = "محصولات مرتبط"
+        ordering = ["product", "rank"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "rank"], name="related_products_product_rank"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.score:.3f})"
+
+
+class RelatedProductsBuild(models.Model):
+    """Log of related products builds; the latest one is the watermark"""
+
+    orders_until = models.DateTimeField(
+        help_text="سفارش‌های تغییر یافته تا این زمان در محاسبه لحاظ شده‌اند"
+    )
+    is_full = models.BooleanField(default=False)
+    products_updated = models.PositiveIntegerField(default=0)
+    orders_scanned = models.PositiveIntegerField(default=0)
+    duration = models.FloatField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "related_products_builds"
+        verbose_name = "محاسبه محصولات مرتبط"
+        verbose_name_plural = "محاسبات محصولات مرتبط"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        kind = "full" if self.is_full else "incremental"
+        return f"{kind} build {self.id} - {self.orders_until}"
@@ -0,0 +1,193 @@
+"""
+Pagination classes for products app
+"""
+import base64
+import datetime
+import json
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, models
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def estimate_count(queryset):
+    """
+    Estimate the number of rows a queryset returns from planner statistics
+
+    Runs ``EXPLAIN`` instead of ``COUNT(*)``, so the cost does not grow with
+    the table. Returns None on databases other than PostgreSQL.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    JSON encoder for cursor payloads
+
+    DjangoJSONEncoder cuts datetimes to milliseconds; the seek predicate
+    needs the stored microseconds or rows sharing the boundary's
+    millisecond are skipped or repeated.
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Page number pagination with an opt-in keyset (cursor) mode
+
+    ``?pagination=cursor`` (or any request carrying ``cursor``) pages with a
+    ``(key, id)`` seek predicate instead of OFFSET and skips ``COUNT(*)``, so
+    every page costs the same regardless of depth. The key is taken from the
+    active ordering when it is one of ``keyset_fields``, otherwise
+    ``default_keyset`` is used. ``id`` breaks ties in the same direction.
+    """
+    mode_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+    keyset_fields = ('created_at',)
+    default_keyset = '-created_at'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def is_keyset_request(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.is_keyset_request(request)
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        self.key, self.descending = self.get_keyset_ordering(queryset)
+        cursor = self.decode_cursor(request, queryset.model)
+        reverse = bool(cursor and cursor['r'])
+
+        # Walking backwards flips the scan direction; the page is put back
+        # into display order below.
+        descending = self.descending != reverse
+        prefix = '-' if descending else ''
+        ordered = queryset.order_by(f'{prefix}{self.key}', f'{prefix}pk')
+
+        if cursor:
+            op = 'lt' if descending else 'gt'
+            ordered = ordered.filter(
+                Q(**{f'{self.key}__{op}': cursor['v']})
+                | Q(**{self.key: cursor['v'], f'pk__{op}': cursor['id']})
+            )
+
+        rows = list(ordered[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page_rows = rows
+        self.estimated_count = estimate_count(queryset)
+        return rows
+
+    def get_keyset_ordering(self, queryset):
+        """Return the (field, descending) pair the page is keyed on"""
+        ordering = list(queryset.query.order_by) or [self.default_keyset]
+        term = ordering[0]
+        if not isinstance(term, str) or term.lstrip('-') not in self.keyset_fields:
+            term = self.default_keyset
+        return term.lstrip('-'), term.startswith('-')
+
+    def encode_cursor(self, row, reverse):
+        value = row[self.key] if isinstance(row, dict) else getattr(row, self.key)
+        pk = row['id'] if isinstance(row, dict) else row.pk
+        payload = json.dumps(
+            {'k': self.key, 'v': value, 'id': pk, 'r': reverse},
+            cls=CursorEncoder,
+            separators=(',', ':'),
+        )
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        field = model._meta.get_field(self.key)
+        if isinstance(field, models.GeneratedField):
+            field = field.output_field
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            cursor = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if cursor['k'] != self.key or not isinstance(cursor['v'], (str, int, float)):
+                raise ValueError
+            # The value ends up in the seek filter; reject anything the key
+            # field cannot hold instead of failing while building the query
+            cursor['v'] = field.to_python(cursor['v'])
+            if cursor['v'] is None:
+                raise ValueError
+            cursor['r'] = bool(cursor.get('r'))
+            cursor['id'] = int(cursor['id'])
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def build_link(self, row, reverse):
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param
+        )
+        url = replace_query_param(url, self.mode_query_param, 'cursor')
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(row, reverse)
+        )
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next or not self.page_rows:
+            return None
+        return self.build_link(self.page_rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        if not self.has_previous or not self.page_rows:
+            return None
+        return self.build_link(self.page_rows[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'estimated_count': self.estimated_count,
+            'results': data,
+        })
+
+
+class ProductPagination(KeysetPagination):
+    """Pagination for the product catalog"""
+    keyset_fields = ('created_at', 'effective_price', 'name')
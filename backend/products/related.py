@@ -0,0 +1,173 @@
+"""
+Co-purchase related products for products app
+"""
+import time
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+from orders.models import Order, OrderItem
+from .cache import CATALOG, bump_cache_version
+from .models import RelatedProduct, RelatedProductsBuild
+
+# Orders that do not count as purchases
+EXCLUDED_ORDER_STATUSES = ('cancelled', 'refunded')
+
+# pg_advisory_lock key held while a build rewrites RelatedProduct rows
+RELATED_LOCK_ID = 725002
+
+
+@contextmanager
+def related_lock():
+    """
+    Serialize related products builds; yields False if another one runs
+
+    The hourly and nightly builds would otherwise delete and re-insert
+    the same products' rows and collide on (product, rank).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s)', [RELATED_LOCK_ID])
+        acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [RELATED_LOCK_ID])
+
+
+def _purchased(items):
+    return items.exclude(order__status__in=EXCLUDED_ORDER_STATUSES)
+
+
+def basket_pairs(items):
+    """Distinct (order_id, product_id) rows of counted orders as an (n, 2) array"""
+    rows = _purchased(items).values_list('order_id', 'product_id').distinct()
+    return np.array(list(rows), dtype=np.int64).reshape(-1, 2)
+
+
+def order_counts(product_ids):
+    """Number of counted orders containing each product, over all history"""
+    rows = (
+        _purchased(OrderItem.objects.filter(product_id__in=product_ids))
+        .values('product_id')
+        .annotate(orders=Count('order_id', distinct=True))
+        .values_list('product_id', 'orders')
+    )
+    return dict(rows)
+
+
+def co_occurrence(pairs, sources=None):
+    """
+    Sparse co-purchase counts as (source, target, count) arrays
+
+    Equivalent to the off-diagonal of B^T B for the order x product
+    incidence matrix B: baskets are self-joined on the order id and the
+    product pairs are counted with np.unique over one int64 key. With
+    ``sources`` only rows for those products are produced.
+    """
+    empty = np.empty(0, dtype=np.int64)
+    if not len(pairs):
+        return empty, empty, empty
+
+    frame = pd.DataFrame(pairs, columns=['order', 'product'])
+    left = frame if sources is None else frame[frame['product'].isin(list(sources))]
+    joined = left.merge(frame, on='order', suffixes=('_source', '_target'))
+    source = joined['product_source'].to_numpy()
+    target = joined['product_target'].to_numpy()
+    distinct = source != target
+    source, target = source[distinct], target[distinct]
+
+    width = int(frame['product'].max()) + 1
+    keys, counts = np.unique(source * width + target, return_counts=True)
+    return keys // width, keys % width, counts
+
+
+def top_neighbours(source, target, score, k):
+    """Keep the k best scored targets per source; returns the arrays and 1-based ranks"""
+    order = np.lexsort((target, -score, source))
+    source, target, score = source[order], target[order], score[order]
+
+    starts = np.flatnonzero(np.r_[True, source[1:] != source[:-1]])
+    lengths = np.diff(np.r_[starts, len(source)])
+    rank = np.arange(len(source)) - np.repeat(starts, lengths) + 1
+
+    keep = rank <= k
+    return source[keep], target[keep], score[keep], rank[keep]
+
+
+def build_related_products(full=False):
+    """
+    Rebuild the RelatedProduct table from order history
+
+    Scores are cosine similarities between the products' order vectors:
+    co-purchases / sqrt(orders(a) * orders(b)). An incremental build only
+    recomputes products that appear in orders changed since the previous
+    build, reading every basket those products were bought in; the daily
+    full build also refreshes neighbours whose order counts drifted.
+
+    Returns None without doing anything when another build holds the lock.
+    """
+    with related_lock() as acquired:
+        if not acquired:
+            return None
+        started = time.monotonic()
+        until = timezone.now()
+        previous = RelatedProductsBuild.objects.first()
+        full = full or previous is None
+
+        if full:
+            pairs = basket_pairs(OrderItem.objects.all())
+            sources = None
+        else:
+            changed = Order.objects.filter(
+                updated_at__gt=previous.orders_until, updated_at__lte=until
+            )
+            sources = set(
+                OrderItem.objects.filter(order__in=changed)
+                .values_list('product_id', flat=True)
+                .distinct()
+            )
+            baskets = OrderItem.objects.filter(order_id__in=(
+                OrderItem.objects.filter(product_id__in=sources).values('order_id')
+            ))
+            pairs = basket_pairs(baskets)
+
+        source, target, counts = co_occurrence(pairs, sources)
+
+        if full:
+            orders = np.bincount(pairs[:, 1]) if len(pairs) else np.zeros(1, dtype=np.int64)
+            source_orders, target_orders = orders[source], orders[target]
+        else:
+            lookup = order_counts(np.unique(np.r_[source, target]).tolist())
+            source_orders = np.array([lookup[i] for i in source.tolist()], dtype=np.int64)
+            target_orders = np.array([lookup[i] for i in target.tolist()], dtype=np.int64)
+
+        score = counts / np.sqrt(source_orders * target_orders)
+        source, target, score, rank = top_neighbours(
+            source, target, score, settings.RELATED_PRODUCTS_TOP_K
+        )
+
+        rows = [
+            RelatedProduct(product_id=s, related_id=t, score=round(float(v), 6), rank=r)
+            for s, t, v, r in zip(source.tolist(), target.tolist(), score.tolist(), rank.tolist())
+        ]
+        with transaction.atomic():
+            stale = RelatedProduct.objects.all()
+            if not full:
+                stale = stale.filter(product_id__in=sources)
+            stale.delete()
+            RelatedProduct.objects.bulk_create(rows, batch_size=1000)
+            build = RelatedProductsBuild.objects.create(
+                orders_until=until,
+                is_full=full,
+                products_updated=len(np.unique(source)) if full else len(sources),
+                orders_scanned=len(np.unique(pairs[:, 0])),
+                duration=round(time.monotonic() - started, 3),
+            )
+
+        bump_cache_version(CATALOG)
+        return build
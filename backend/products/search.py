@@ -0,0 +1,126 @@
+"""
+Full-text search for products app
+"""
+import re
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import F, Func, TextField, Value
+from rest_framework import filters
+from .utils import PERSIAN_NORMALIZATION, PERSIAN_REMOVED_CHARS, normalize_persian
+
+# PostgreSQL has no Persian dictionary; 'simple' lowercases without stemming
+SEARCH_CONFIG = 'simple'
+
+# translate() maps characters one-to-one and drops the unmatched tail of
+# "from", which mirrors normalize_persian() in SQL
+TRANSLATE_FROM = ''.join(PERSIAN_NORMALIZATION) + PERSIAN_REMOVED_CHARS
+TRANSLATE_TO = ''.join(PERSIAN_NORMALIZATION.values())
+
+SKU_PATTERN = re.compile(r'[A-Za-z0-9_\-]*\d[A-Za-z0-9_\-]*')
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def normalized(expression):
+    """SQL counterpart of utils.normalize_persian() for a text expression"""
+    return Func(
+        expression,
+        Value(TRANSLATE_FROM),
+        Value(TRANSLATE_TO),
+        function='translate',
+        output_field=TextField(),
+    )
+
+
+def product_search_vector():
+    """Weighted search vector computed from a product row's own columns"""
+    return (
+        SearchVector(normalized(F('name')), weight='A', config=SEARCH_CONFIG)
+        + SearchVector(normalized(F('sku')), weight='A', config=SEARCH_CONFIG)
+        + SearchVector(normalized(F('short_description')), weight='B', config=SEARCH_CONFIG)
+        + SearchVector(normalized(F('description')), weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def product_search_vector_for(product):
+    """
+    Search vector for an unsaved product instance
+
+    Built from Python-normalized values so it can be written in the same
+    INSERT/UPDATE as the rest of the row.
+    """
+    def part(value, weight):
+        return SearchVector(
+            Value(normalize_persian(value), output_field=TextField()),
+            weight=weight,
+            config=SEARCH_CONFIG,
+        )
+
+    return (
+        part(product.name, 'A')
+        + part(product.sku, 'A')
+        + part(product.short_description, 'B')
+        + part(product.description, 'C')
+    )
+
+
+def build_search_query(term):
+    """Prefix-matching tsquery that requires every word of a normalized term"""
+    tokens = TOKEN_PATTERN.findall(term)
+    if not tokens:
+        return None
+    raw = ' & '.join(f'{token}:*' for token in tokens)
+    return SearchQuery(raw, search_type='raw', config=SEARCH_CONFIG)
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    Ranked full-text search over Product.search_vector
+
+    An exact SKU match short-circuits the text search. Falls back to the
+    stock ILIKE search on databases other than PostgreSQL.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        term = normalize_persian(request.query_params.get(self.search_param, ''))
+        if not term:
+            return queryset
+
+        if connections[queryset.db].vendor != 'postgresql':
+            return super().filter_queryset(request, queryset, view)
+
+        if SKU_PATTERN.fullmatch(term):
+            by_sku = queryset.filter(sku=term)
+            if by_sku.exists():
+                return by_sku.annotate(search_rank=Value(1.0))
+
+        query = build_search_query(term)
+        if query is None:
+            return queryset.none()
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        )
+
+
+class ProductOrderingFilter(filters.OrderingFilter):
+    """
+    Ordering filter that sorts search results by relevance by default
+
+    ``price`` sorts by the stored effective price, i.e. the sale price when
+    one applies.
+    """
+    field_aliases = {'price': 'effective_price'}
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering:
+            ordering = [self.resolve_alias(term) for term in ordering]
+        explicit = request.query_params.get(self.ordering_param)
+        if not explicit and 'search_rank' in queryset.query.annotations:
+            return ['-search_rank', *(ordering or [])]
+        return ordering
+
+    def resolve_alias(self, term):
+        if not isinstance(term, str):
+            return term
+        prefix = '-' if term.startswith('-') else ''
+        return prefix + self.field_aliases.get(term.lstrip('-'), term.lstrip('-'))
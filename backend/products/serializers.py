@@ -1,25 +1,87 @@
 """
 Serializers for products app
 """
+from types import SimpleNamespace
+from urllib.parse import urljoin
+from django.core.files.storage import FileSystemStorage
+from django.utils.encoding import filepath_to_uri
 from rest_framework import serializers
+from .images import srcset
 from .models import (
     Category, Product, ProductImage, ProductAttribute,
     ProductAttributeValue, ProductReview
 )
 
 
+def absolute_media_url(context, file):
+    """
+    Build an absolute URL for a stored file.
+
+    The scheme/host prefix is resolved once and memoized on the serializer
+    context, so list serializers don't call build_absolute_uri per row.
+    """
+    if not file:
+        return None
+    return absolute_storage_url(context, file.storage, file.name)
+
+
+def absolute_storage_url(context, storage, name):
+    """absolute_media_url() for a bare file name, e.g. from .values()"""
+    if not name:
+        return None
+    return urljoin(absolute_url_base(context), storage.url(name))
+
+
+def absolute_url_base(context):
+    """Scheme and host of the request, memoized on the serializer context"""
+    base = context.get('_absolute_url_base')
+    if base is None:
+        request = context.get('request')
+        base = request.build_absolute_uri('/') if request else ''
+        context['_absolute_url_base'] = base
+    return base
+
+
+def variants_srcset(context, storage, variants):
+    """Absolute ``{format: srcset}`` for an image_variants map"""
+    return srcset(variants, lambda name: absolute_storage_url(context, storage, name))
+
+
+def requested_fields(request, available):
+    """
+    Fields named in ``?fields=`` that exist in ``available``, in their order
+
+    Returns None (all fields) when the parameter is missing or names none of
+    the available fields.
+    """
+    raw = request.query_params.get('fields') if request else None
+    if not raw:
+        return None
+    wanted = {name.strip() for name in raw.split(',')}
+    fields = [name for name in available if name in wanted]
+    return fields or None
+
+
 class CategorySerializer(serializers.ModelSerializer):
     """Category Serializer"""
     children = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Category
         fields = [
-            'id', 'name', 'slug', 'description', 'image',
+            'id', 'name', 'slug', 'description', 'image', 'image_srcset',
             'parent', 'children', 'is_active', 'created_at'
         ]
 
+    def get_image_srcset(self, obj):
+        return variants_srcset(self.context, obj.image.storage, obj.image_variants)
+
     def get_children(self, obj):
+        # {parent_id: [children]} built in memory by CategoryViewSet
+        children = self.context.get('category_children')
+        if children is not None:
+            return CategorySerializer(children.get(obj.pk, []), many=True, context=self.context).data
         if obj.children.exists():
             return CategorySerializer(obj.children.filter(is_active=True), many=True).data
         return []
@@ -27,10 +89,14 @@ class CategorySerializer(serializers.ModelSerializer):
 
 class ProductImageSerializer(serializers.ModelSerializer):
     """Product Image Serializer"""
+    srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = ProductImage
-        fields = ['id', 'image', 'alt_text', 'is_primary', 'order']
+        fields = ['id', 'image', 'srcset', 'alt_text', 'is_primary', 'order']
+
+    def get_srcset(self, obj):
+        return variants_srcset(self.context, obj.image.storage, obj.image_variants)
 
 
 class ProductAttributeValueSerializer(serializers.ModelSerializer):
@@ -63,6 +129,7 @@ class ProductListSerializer(serializers.ModelSerializer):
     """Product List Serializer (for list views)"""
     category_name = serializers.CharField(source='category.name', read_only=True)
     primary_image = serializers.SerializerMethodField()
+    primary_image_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Product
@@ -71,14 +138,114 @@ class ProductListSerializer(serializers.ModelSerializer):
             'category', 'category_name', 'price', 'sale_price',
             'final_price', 'discount_percentage', 'stock_quantity',
             'is_in_stock', 'is_on_sale', 'is_featured',
-            'primary_image', 'unit'
+            'primary_image', 'primary_image_srcset', 'unit'
         ]
 
     def get_primary_image(self, obj):
-        primary_image = obj.images.filter(is_primary=True).first()
-        if primary_image:
-            return self.context['request'].build_absolute_uri(primary_image.image.url)
-        return None
+        return absolute_media_url(self.context, obj.primary_image)
+
+    def get_primary_image_srcset(self, obj):
+        return variants_srcset(
+            self.context, obj.primary_image.storage, obj.primary_image_variants
+        )
+
+
+class ProductRow(SimpleNamespace):
+    """A .values() row exposing Product's computed price and stock properties"""
+    is_on_sale = Product.is_on_sale
+    final_price = Product.final_price
+    discount_percentage = Product.discount_percentage
+    is_in_stock = Product.is_in_stock
+
+
+class ProductListValues:
+    """
+    ProductListSerializer output built from ``.values()`` rows
+
+    Used by the hot list endpoints: only the columns behind the requested
+    fields are selected, no model instances are created and each row is
+    turned into a dict directly. Computed fields reuse the Product
+    properties, so the rendered output is identical to
+    ProductListSerializer.
+    """
+    # Field -> .values() lookups it is built from
+    sources = {
+        'id': ['id'],
+        'name': ['name'],
+        'slug': ['slug'],
+        'sku': ['sku'],
+        'short_description': ['short_description'],
+        'category': ['category'],
+        'category_name': ['category__name'],
+        'price': ['price'],
+        'sale_price': ['sale_price'],
+        'final_price': ['price', 'sale_price'],
+        'discount_percentage': ['price', 'sale_price'],
+        'stock_quantity': ['stock_quantity'],
+        'is_in_stock': ['stock_quantity'],
+        'is_on_sale': ['price', 'sale_price'],
+        'is_featured': ['is_featured'],
+        'primary_image': ['primary_image'],
+        'primary_image_srcset': ['primary_image_variants'],
+        'unit': ['unit'],
+    }
+    properties = ('final_price', 'discount_percentage', 'is_in_stock', 'is_on_sale')
+    decimal = serializers.DecimalField(max_digits=12, decimal_places=0)
+
+    def __init__(self, fields=None, context=None):
+        self.fields = fields or list(ProductListSerializer.Meta.fields)
+        self.context = {} if context is None else context
+        self.storage = Product._meta.get_field('primary_image').storage
+        self.media_prefix = None
+
+    def get_columns(self, *extra):
+        """.values() lookups for the fields, plus any extra ones the caller needs"""
+        columns = []
+        for source in [*(s for name in self.fields for s in self.sources[name]), *extra]:
+            if source not in columns:
+                columns.append(source)
+        return columns
+
+    def to_representation(self, row):
+        data = {}
+        instance = None
+        if any(name in self.properties for name in self.fields):
+            instance = ProductRow(**row)
+        for name in self.fields:
+            if name in self.properties:
+                data[name] = getattr(instance, name)
+            elif name in ('price', 'sale_price'):
+                value = row[name]
+                data[name] = None if value is None else self.decimal.to_representation(value)
+            elif name == 'category_name':
+                # ProductListSerializer skips the field for uncategorized products
+                if row['category__name'] is not None:
+                    data[name] = row['category__name']
+            elif name == 'primary_image':
+                data[name] = self.image_url(row['primary_image'])
+            elif name == 'primary_image_srcset':
+                data[name] = srcset(row['primary_image_variants'], self.image_url)
+            else:
+                data[name] = row[name]
+        return data
+
+    def image_url(self, name):
+        """
+        absolute_storage_url() for the primary image
+
+        Local storage URLs are the media URL plus the quoted name, so the
+        joined prefix is computed once instead of two urljoin() calls a row.
+        """
+        if not name:
+            return None
+        if not isinstance(self.storage, FileSystemStorage):
+            return absolute_storage_url(self.context, self.storage, name)
+        if self.media_prefix is None:
+            self.media_prefix = urljoin(absolute_url_base(self.context), self.storage.base_url)
+        return self.media_prefix + filepath_to_uri(name).lstrip('/')
+
+    def serialize(self, rows):
+        return [self.to_representation(row) for row in rows]
 
 
 class ProductDetailSerializer(serializers.ModelSerializer):
@@ -88,7 +255,8 @@ class ProductDetailSerializer(serializers.ModelSerializer):
     attributes = ProductAttributeValueSerializer(many=True, read_only=True)
     reviews = serializers.SerializerMethodField()
     average_rating = serializers.SerializerMethodField()
-    reviews_count = serializers.SerializerMethodField()
+    reviews_count = serializers.IntegerField(source='rating_count', read_only=True)
+    rating_histogram = serializers.DictField(read_only=True)
     
     class Meta:
         model = Product
@@ -99,23 +267,21 @@ class ProductDetailSerializer(serializers.ModelSerializer):
             'is_in_stock', 'is_low_stock', 'is_on_sale', 'is_featured',
             'unit', 'weight', 'images', 'attributes',
             'meta_title', 'meta_description', 'reviews', 'average_rating',
-            'reviews_count', 'created_at', 'updated_at'
+            'reviews_count', 'rating_histogram', 'created_at', 'updated_at'
         ]
 
     def get_reviews(self, obj):
-        approved_reviews = obj.reviews.filter(is_approved=True)[:5]
+        # Prefetched by ProductViewSet for the detail view
+        approved_reviews = getattr(obj, 'approved_reviews', None)
+        if approved_reviews is None:
+            approved_reviews = obj.reviews.filter(is_approved=True).select_related('user')[:5]
         return ProductReviewSerializer(approved_reviews, many=True).data
 
     def get_average_rating(self, obj):
-        approved_reviews = obj.reviews.filter(is_approved=True)
-        if approved_reviews.exists():
-            total = sum(review.rating for review in approved_reviews)
-            return round(total / approved_reviews.count(), 1)
+        if obj.rating_count:
+            return round(float(obj.rating_avg), 1)
         return 0
 
-    def get_reviews_count(self, obj):
-        return obj.reviews.filter(is_approved=True).count()
-
 
 class ProductCreateUpdateSerializer(serializers.ModelSerializer):
     """Serializer for creating/updating products"""
@@ -128,3 +294,45 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
             'low_stock_threshold', 'unit', 'weight',
             'is_active', 'is_featured', 'meta_title', 'meta_description'
         ]
+
+    def update(self, instance, validated_data):
+        # Only the submitted fields are written; counters maintained by F()
+        # updates (reserved_quantity, sales_count, ratings) are left alone
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
+
+
+class ProductBatchSerializer(serializers.Serializer):
+    """Request body of ProductViewSet.batch: one list of ids, slugs or SKUs"""
+    LIMIT = 200
+    LOOKUPS = ('ids', 'slugs', 'skus')
+    # Output fields of the cheap cart/price refresh mode
+    PRICE_FIELDS = [
+        'id', 'slug', 'sku', 'price', 'sale_price', 'final_price',
+        'is_on_sale', 'stock_quantity', 'is_in_stock'
+    ]
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False,
+        allow_empty=False, max_length=LIMIT
+    )
+    slugs = serializers.ListField(
+        child=serializers.CharField(max_length=300), required=False,
+        allow_empty=False, max_length=LIMIT
+    )
+    skus = serializers.ListField(
+        child=serializers.CharField(max_length=100), required=False,
+        allow_empty=False, max_length=LIMIT
+    )
+    mode = serializers.ChoiceField(choices=['cards', 'prices'], default='cards')
+
+    def validate(self, data):
+        lookups = [name for name in self.LOOKUPS if name in data]
+        if len(lookups) != 1:
+            raise serializers.ValidationError(
+                "دقیقاً یکی از فیلدهای ids، slugs یا skus باید ارسال شود"
+            )
+        data['lookup'] = lookups[0]
+        return data
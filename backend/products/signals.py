@@ -0,0 +1,46 @@
+"""
+Signal handlers for products app
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .cache import CATALOG, CATEGORY_TREE, bump_cache_version
+from .models import Category, Product, ProductAttributeValue, ProductImage, ProductReview
+from .tasks import queue_image_variants
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree(sender, **kwargs):
+    bump_cache_version(CATEGORY_TREE)
+    bump_cache_version(CATALOG)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductAttributeValue)
+@receiver(post_delete, sender=ProductAttributeValue)
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+def invalidate_catalog(sender, **kwargs):
+    bump_cache_version(CATALOG)
+
+
+@receiver(post_delete, sender=ProductImage)
+def sync_primary_image(sender, instance, **kwargs):
+    # Also runs for the admin's bulk delete and queryset deletes
+    ProductImage.sync_product_primary_image(instance.product_id)
+
+
+@receiver(post_delete, sender=ProductReview)
+def uncount_review_rating(sender, instance, **kwargs):
+    # Also runs for queryset deletes and cascades from users and products
+    instance.uncount_rating()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=ProductImage)
+def generate_image_variants(sender, instance, **kwargs):
+    if instance.needs_variants():
+        queue_image_variants(instance)
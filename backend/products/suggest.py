@@ -0,0 +1,85 @@
+"""
+Typeahead suggestions for product and category names
+"""
+import hashlib
+from django.conf import settings
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, Count, F, FloatField, Q, Value, When
+from django.db.models.functions import Ln
+from .models import Category, Product
+from .search import normalized
+from .utils import normalize_persian
+
+SUGGEST_MIN_LENGTH = 2
+
+# Names that start with the typed prefix rank above mid-word matches
+PREFIX_BONUS = 0.5
+
+# Weight of ln(1 + popularity) added to the trigram similarity
+POPULARITY_WEIGHT = 0.05
+
+
+def _rank(queryset, prefix, popularity, limit):
+    """Top name/slug pairs of a queryset by word similarity plus popularity"""
+    if connection.vendor != 'postgresql':
+        return list(
+            queryset.filter(name__icontains=prefix)
+            .order_by('name')
+            .values('name', 'slug')[:limit]
+        )
+
+    return list(
+        queryset.annotate(normalized_name=normalized(F('name')))
+        .filter(normalized_name__trigram_word_similar=prefix)
+        .annotate(
+            popularity=popularity,
+            score=(
+                TrigramWordSimilarity(prefix, 'normalized_name')
+                + Case(
+                    When(normalized_name__istartswith=prefix, then=Value(PREFIX_BONUS)),
+                    default=Value(0.0),
+                    output_field=FloatField(),
+                )
+                + Ln(F('popularity') + 1) * POPULARITY_WEIGHT
+            ),
+        )
+        .order_by('-score', 'name')
+        .values('name', 'slug')[:limit]
+    )
+
+
+def suggest(term, limit):
+    """
+    Product and category suggestions for a typeahead prefix
+
+    Results are cached per normalized prefix for SUGGEST_CACHE_TIMEOUT
+    seconds, so hot prefixes are answered without touching the database.
+    """
+    prefix = normalize_persian(term)
+    if len(prefix) < SUGGEST_MIN_LENGTH:
+        return {'products': [], 'categories': []}
+
+    digest = hashlib.md5(prefix.lower().encode()).hexdigest()
+    cache_key = f'suggest:{limit}:{digest}'
+    result = cache.get(cache_key)
+    if result is not None:
+        return result
+
+    result = {
+        'products': _rank(
+            Product.objects.filter(is_active=True),
+            prefix,
+            F('sales_count'),
+            limit,
+        ),
+        'categories': _rank(
+            Category.objects.filter(is_active=True),
+            prefix,
+            Count('products', filter=Q(products__is_active=True)),
+            limit,
+        ),
+    }
+    cache.set(cache_key, result, settings.SUGGEST_CACHE_TIMEOUT)
+    return result
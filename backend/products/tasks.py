@@ -0,0 +1,89 @@
+"""
+Celery tasks for products app
+"""
+import logging
+from celery import shared_task
+from django.apps import apps
+from django.db import transaction
+from django.utils import timezone
+from .cache import CATALOG, CATEGORY_TREE, bump_cache_version
+from .images import build_variants, delete_stale_variants
+from .models import Category, ProductImage
+from .related import build_related_products
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, max_retries=10)
+def rebuild_related_products(self, full=False):
+    """
+    Refresh co-purchase related products (incremental unless full=True)
+
+    Retried while another build holds the lock.
+    """
+    build = build_related_products(full=full)
+    if build is None:
+        raise self.retry(countdown=60)
+    kind = "Full" if build.is_full else "Incremental"
+    return f"{kind} related products build: {build.products_updated} products updated"
+
+
+def refresh_image_variants(model, pk):
+    """Build and store the variants of one ProductImage or Category image"""
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not instance.image:
+        return False
+
+    variants = build_variants(instance.image)
+    # Skip the write if the image was replaced while we were resizing it
+    current = model.objects.filter(pk=pk, image=instance.image.name)
+    if model is Category:
+        updated = current.update(image_variants=variants, updated_at=timezone.now())
+        bump_cache_version(CATEGORY_TREE)
+    else:
+        updated = current.update(image_variants=variants)
+        ProductImage.sync_product_primary_image(instance.product_id)
+    bump_cache_version(CATALOG)
+    if updated:
+        delete_stale_variants(instance.image.storage, instance.image_variants, variants)
+    return bool(updated)
+
+
+@shared_task(ignore_result=True)
+def generate_image_variants(model_label, pk):
+    """Generate resized WebP/JPEG variants for a ProductImage or Category"""
+    refreshed = refresh_image_variants(apps.get_model(model_label), pk)
+    return f"{model_label} {pk}: {'variants generated' if refreshed else 'skipped'}"
+
+
+@shared_task
+def generate_image_variants_batch(model_label, pks):
+    """generate_image_variants for a batch of rows (used by the backfill)"""
+    model = apps.get_model(model_label)
+    done = 0
+    for pk in pks:
+        try:
+            done += refresh_image_variants(model, pk)
+        except Exception:
+            logger.exception('Could not generate variants for %s %s', model_label, pk)
+    return f"{model_label}: {done}/{len(pks)} variants generated"
+
+
+def queue_image_variants(instance):
+    """
+    Generate an instance's variants once the current transaction commits
+
+    Runs on Celery when it is available, otherwise synchronously.
+    """
+    model_label, pk = instance._meta.label, instance.pk
+
+    def dispatch():
+        try:
+            generate_image_variants.delay(model_label, pk)
+        except Exception:
+            try:
+                generate_image_variants(model_label, pk)
+            except Exception:
+                logger.exception('Could not generate variants for %s %s', model_label, pk)
+
+    transaction.on_commit(dispatch)
@@ -0,0 +1,59 @@
+"""
+Tests for products app
+"""
+from datetime import timedelta
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from .models import Category, Product
+
+
+class KeysetPaginationTests(APITestCase):
+    """Cursor pages across rows created within the same millisecond"""
+
+    url = '/api/products/products/?pagination=cursor'
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Category')
+        cls.ids = [
+            Product.objects.create(
+                name=f'Product {i}', sku=f'SKU{i}', price=1000, category=category
+            ).pk
+            for i in range(45)
+        ]
+        # Keys one microsecond apart, all inside a single millisecond
+        base = timezone.now().replace(microsecond=123000)
+        for offset, pk in enumerate(cls.ids):
+            Product.objects.filter(pk=pk).update(
+                created_at=base + timedelta(microseconds=offset)
+            )
+        cls.newest_first = sorted(cls.ids, reverse=True)
+
+    def page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_forward_pages_cover_every_row_once(self):
+        seen = []
+        url = self.url
+        while url:
+            data = self.page(url)
+            seen += [row['id'] for row in data['results']]
+            url = data['next']
+        self.assertEqual(seen, self.newest_first)
+
+    def test_previous_returns_the_page_before(self):
+        first = self.page(self.url)
+        second = self.page(first['next'])
+        back = self.page(second['previous'])
+        self.assertEqual(
+            [row['id'] for row in first['results']], self.newest_first[:20]
+        )
+        self.assertEqual(
+            [row['id'] for row in second['results']], self.newest_first[20:40]
+        )
+        self.assertEqual(
+            [row['id'] for row in back['results']], self.newest_first[:20]
+        )
+        self.assertIsNone(back['previous'])
@@ -3,7 +3,7 @@ URLs for products app
 """
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CategoryViewSet, ProductViewSet, ProductReviewViewSet
+from .views import CategoryViewSet, ProductViewSet, ProductReviewViewSet, suggest
 
 router = DefaultRouter()
 router.register('categories', CategoryViewSet, basename='category')
@@ -11,5 +11,6 @@ router.register('products', ProductViewSet, basename='product')
 router.register('reviews', ProductReviewViewSet, basename='review')
 
 urlpatterns = [
+    path('suggest/', suggest, name='suggest'),
     path('', include(router.urls)),
 ]
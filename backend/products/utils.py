@@ -3,6 +3,7 @@ Utility functions for products app
 """
 
 import re
+from django.db.models import Q
 from django.utils.text import slugify
 
 
@@ -22,6 +23,47 @@ PERSIAN_TO_ENGLISH = {
 }
 
 
+# Arabic/Persian variants folded to one form before indexing or searching
+PERSIAN_NORMALIZATION = {
+    'ي': 'ی', 'ى': 'ی', 'ك': 'ک', 'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'ٱ': 'ا',
+    '\u200c': ' ',  # ZWNJ
+    # Numbers
+    '۰': '0', '۱': '1', '۲': '2', '۳': '3', '۴': '4',
+    '۵': '5', '۶': '6', '۷': '7', '۸': '8', '۹': '9',
+    # Arabic numbers
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+    '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+}
+
+# Characters dropped entirely: harakat, tanwin, shadda, sukun and tatweel
+PERSIAN_REMOVED_CHARS = '\u064b\u064c\u064d\u064e\u064f\u0650\u0651\u0652\u0640'
+
+_NORMALIZATION_TABLE = str.maketrans({
+    **PERSIAN_NORMALIZATION,
+    **{char: None for char in PERSIAN_REMOVED_CHARS},
+})
+
+
+def normalize_persian(text):
+    """
+    Normalize Persian text for search
+
+    Folds Arabic letter forms and digits to their Persian/ASCII equivalents,
+    turns ZWNJ into a space, drops diacritics and collapses whitespace.
+    The same mapping is applied in SQL by products.search.normalized().
+
+    Args:
+        text: Input text
+
+    Returns:
+        Normalized text
+    """
+    if not text:
+        return ''
+    return ' '.join(str(text).translate(_NORMALIZATION_TABLE).split())
+
+
 def persian_to_english(text):
     """
     Convert Persian/Arabic characters to English transliteration
@@ -46,46 +88,92 @@ def persian_to_english(text):
     return ''.join(result)
 
 
-def generate_unique_slug(model_class, text, instance=None):
+def slug_base(text):
     """
-    Generate a unique slug for a model instance
+    Transliterated ASCII slug for text, without any uniqueness suffix
 
     Args:
-        model_class: The model class (Product or Category)
         text: The text to create slug from
-        instance: The current instance (for updates)
 
     Returns:
-        A unique slug string
+        Slug string ('item' if nothing is left after slugify)
     """
-    # First, transliterate Persian to English
-    transliterated = persian_to_english(text)
+    # First, transliterate Persian to English, then slugify
+    return slugify(persian_to_english(text or ''), allow_unicode=False) or 'item'
 
-    # Then create slug (this will handle spaces, special chars, etc.)
-    base_slug = slugify(transliterated, allow_unicode=False)
 
-    # If empty after slugify, use a default
-    if not base_slug:
-        base_slug = 'item'
+class SlugAllocator:
+    """
+    Hands out unique ``base``/``base-N`` slugs for a model
 
-    # Check if slug exists
-    slug = base_slug
-    counter = 1
+    Slugs already taken for a base are read with one indexed prefix query
+    (several bases are OR-ed into one query) and the next free suffix is
+    picked in memory. Slugs handed out are remembered, so one allocator
+    can fill thousands of rows without duplicates between them.
+    """
 
-    while True:
-        # Check if slug exists (excluding current instance if updating)
-        queryset = model_class.objects.filter(slug=slug)
-        if instance and instance.pk:
-            queryset = queryset.exclude(pk=instance.pk)
+    # Bases OR-ed into one prefix query
+    QUERY_CHUNK = 200
+
+    def __init__(self, model_class, exclude_pks=()):
+        self.model_class = model_class
+        self.exclude_pks = set(exclude_pks)
+        self.taken = set()
+        self.next_suffix = {}
+
+    def _load(self, bases):
+        bases = [base for base in dict.fromkeys(bases) if base not in self.next_suffix]
+        for i in range(0, len(bases), self.QUERY_CHUNK):
+            chunk = bases[i:i + self.QUERY_CHUNK]
+            query = Q()
+            for base in chunk:
+                query |= Q(slug=base) | Q(slug__startswith=f'{base}-')
+            queryset = self.model_class.objects.filter(query)
+            if self.exclude_pks:
+                queryset = queryset.exclude(pk__in=self.exclude_pks)
+            self.taken.update(queryset.values_list('slug', flat=True))
+            for base in chunk:
+                self.next_suffix[base] = 0
+
+    def _next(self, base):
+        suffix = self.next_suffix[base]
+        slug = base if suffix == 0 else f'{base}-{suffix}'
+        while slug in self.taken:
+            suffix += 1
+            slug = f'{base}-{suffix}'
+        self.next_suffix[base] = suffix + 1
+        self.taken.add(slug)
+        return slug
+
+    def allocate(self, texts):
+        """
+        Unique slugs for texts, in the same order
+
+        Args:
+            texts: Iterable of texts to create slugs from
 
-        if not queryset.exists():
-            break
+        Returns:
+            List of slug strings
+        """
+        bases = [slug_base(text) for text in texts]
+        self._load(bases)
+        return [self._next(base) for base in bases]
 
-        # Add counter and try again
-        slug = f"{base_slug}-{counter}"
-        counter += 1
 
-    return slug
+def generate_unique_slug(model_class, text, instance=None):
+    """
+    Generate a unique slug for a model instance
+
+    Args:
+        model_class: The model class (Product or Category)
+        text: The text to create slug from
+        instance: The current instance (for updates)
+
+    Returns:
+        A unique slug string
+    """
+    exclude_pks = [instance.pk] if instance and instance.pk else []
+    return SlugAllocator(model_class, exclude_pks).allocate([text])[0]
 
 
 def clean_slug(slug):
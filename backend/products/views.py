@@ -1,29 +1,112 @@
 """
 Views for products app
 """
-from rest_framework import viewsets, filters, status
-from rest_framework.decorators import action
+from rest_framework import viewsets, status
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
+from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Avg
-from .models import Category, Product, ProductReview
+from django.core.cache import cache
+from django.db.models import Q, Avg, Prefetch
+from django.http import Http404
+from .cache import CATEGORY_TREE, VERSIONED_CACHE_TIMEOUT, cache_response, get_cache_version
+from .conditional import (
+    category_products_last_modified,
+    category_tree_last_modified,
+    conditional_response,
+    product_last_modified,
+    product_list_last_modified,
+)
+from .facets import cached_product_facets
+from .models import Category, Product, ProductAttributeValue, ProductReview
+from .pagination import ProductPagination
+from .search import ProductOrderingFilter, ProductSearchFilter
+from .suggest import suggest as suggest_names
 from .serializers import (
     CategorySerializer,
     ProductListSerializer,
+    ProductListValues,
+    ProductBatchSerializer,
     ProductDetailSerializer,
     ProductCreateUpdateSerializer,
-    ProductReviewSerializer
+    ProductReviewSerializer,
+    requested_fields
 )
 
 
+# Products returned by ProductViewSet.related
+RELATED_PRODUCTS_LIMIT = 6
+
+
+def product_list_values(request, context):
+    """ProductListValues narrowed to the request's ?fields= parameter"""
+    return ProductListValues(
+        fields=requested_fields(request, ProductListSerializer.Meta.fields),
+        context=context
+    )
+
+
 class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for categories"""
     queryset = Category.objects.filter(is_active=True).order_by("parent", "name")
     serializer_class = CategorySerializer
     lookup_field = 'slug'
 
+    def get_tree(self):
+        """
+        Serialized active categories with nested children
+
+        Loaded with one query, assembled in memory and cached until any
+        category is saved or deleted.
+        """
+        request = self.request
+        cache_key = 'category_tree:{}:{}'.format(
+            get_cache_version(CATEGORY_TREE),
+            request.build_absolute_uri('/'),
+        )
+        tree = cache.get(cache_key)
+        if tree is not None:
+            return tree
+
+        # Siblings come out of the queryset already ordered by name
+        categories = list(self.get_queryset())
+        children = {}
+        for category in categories:
+            children.setdefault(category.parent_id, []).append(category)
+
+        nodes = list(CategorySerializer(
+            categories,
+            many=True,
+            context={**self.get_serializer_context(), 'category_children': children}
+        ).data)
+        tree = {
+            'nodes': nodes,
+            'by_slug': {node['slug']: index for index, node in enumerate(nodes)},
+        }
+        cache.set(cache_key, tree, VERSIONED_CACHE_TIMEOUT)
+        return tree
+
+    @conditional_response(category_tree_last_modified)
+    @cache_response()
+    def list(self, request, *args, **kwargs):
+        nodes = self.get_tree()['nodes']
+        page = self.paginate_queryset(nodes)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(nodes)
+
+    @conditional_response(category_tree_last_modified)
+    @cache_response()
+    def retrieve(self, request, *args, **kwargs):
+        tree = self.get_tree()
+        index = tree['by_slug'].get(kwargs[self.lookup_field])
+        if index is None:
+            raise Http404
+        return Response(tree['nodes'][index])
+
     @action(detail=True, methods=['get'])
+    @conditional_response(category_products_last_modified)
+    @cache_response()
     def products(self, request, slug=None):
         """Get products in a category"""
         category = self.get_object()
@@ -31,21 +114,17 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
             category=category,
             is_active=True
         )
-
-        serializer = ProductListSerializer(
-            products,
-            many=True,
-            context={'request': request}
-        )
-        return Response(serializer.data)
+        values = product_list_values(request, self.get_serializer_context())
+        return Response(values.serialize(products.values(*values.get_columns())))
 
 
 class ProductViewSet(viewsets.ModelViewSet):
     """ViewSet for products"""
-    queryset = Product.objects.filter(is_active=True)
+    queryset = Product.objects.filter(is_active=True).select_related('category')
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = ProductPagination
     lookup_field = 'slug'
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, ProductOrderingFilter]
     filterset_fields = ['category', 'is_featured', 'is_active']
     search_fields = ['name', 'description', 'sku']
     ordering_fields = ['price', 'created_at', 'name', 'stock_quantity']
@@ -58,17 +137,53 @@ class ProductViewSet(viewsets.ModelViewSet):
             return ProductCreateUpdateSerializer
         return ProductDetailSerializer
 
+    @conditional_response(product_list_last_modified)
+    @cache_response()
+    def list(self, request, *args, **kwargs):
+        # Plain dicts from .values(), paginated like the model queryset
+        values = product_list_values(request, self.get_serializer_context())
+        keyset_fields = getattr(self.paginator, 'keyset_fields', ())
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.values(*values.get_columns('id', *keyset_fields))
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(values.serialize(page))
+        return Response(values.serialize(rows))
+
+    @conditional_response(product_last_modified)
+    @cache_response()
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def get_queryset(self):
         queryset = super().get_queryset()
+
+        if self.action == 'retrieve':
+            # Detail view: fixed number of queries regardless of content
+            queryset = queryset.prefetch_related(
+                'images',
+                Prefetch(
+                    'attributes',
+                    queryset=ProductAttributeValue.objects.select_related('attribute')
+                ),
+                Prefetch(
+                    'reviews',
+                    queryset=ProductReview.objects.filter(
+                        is_approved=True
+                    ).select_related('user')[:5],
+                    to_attr='approved_reviews'
+                ),
+            )
         
-        # Filter by price range
+        # Filter by price range (the price customers pay)
         min_price = self.request.query_params.get('min_price')
         max_price = self.request.query_params.get('max_price')
         
         if min_price:
-            queryset = queryset.filter(price__gte=min_price)
+            queryset = queryset.filter(effective_price__gte=min_price)
         if max_price:
-            queryset = queryset.filter(price__lte=max_price)
+            queryset = queryset.filter(effective_price__lte=max_price)
         
         # Filter by stock status
         in_stock = self.request.query_params.get('in_stock')
@@ -78,47 +193,97 @@ class ProductViewSet(viewsets.ModelViewSet):
         # Filter by sale
         on_sale = self.request.query_params.get('on_sale')
         if on_sale == 'true':
-            queryset = queryset.filter(sale_price__isnull=False)
+            queryset = queryset.filter(on_sale=True)
         
         return queryset
 
     @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Facet counts for the filter sidebar, using the list filters"""
+        facets = cached_product_facets(
+            lambda: self.filter_queryset(self.get_queryset()),
+            request.query_params
+        )
+        return Response(facets)
+
+    @action(detail=False, methods=['post'], permission_classes=[AllowAny])
+    def batch(self, request):
+        """
+        Look up many products by ids, slugs or SKUs in one query
+
+        Results follow the request order; identifiers without an active
+        product are listed in ``missing``. ``mode=prices`` returns only
+        price and stock fields for cart refreshes.
+        """
+        serializer = ProductBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        lookup = serializer.validated_data['lookup']
+        identifiers = list(dict.fromkeys(serializer.validated_data[lookup]))
+        column = {'ids': 'id', 'slugs': 'slug', 'skus': 'sku'}[lookup]
+
+        if serializer.validated_data['mode'] == 'prices':
+            values = ProductListValues(
+                fields=ProductBatchSerializer.PRICE_FIELDS,
+                context=self.get_serializer_context()
+            )
+        else:
+            values = product_list_values(request, self.get_serializer_context())
+        rows = self.queryset.filter(**{f'{column}__in': identifiers}).values(
+            *values.get_columns(column)
+        )
+        found = {row[column]: row for row in rows}
+
+        return Response({
+            'results': [
+                values.to_representation(found[identifier])
+                for identifier in identifiers if identifier in found
+            ],
+            'missing': [identifier for identifier in identifiers if identifier not in found],
+        })
+
+    @action(detail=False, methods=['get'])
+    @cache_response()
     def featured(self, request):
         """Get featured products"""
-        products = self.queryset.filter(is_featured=True)[:8]
-        serializer = ProductListSerializer(
-            products,
-            many=True,
-            context={'request': request}
-        )
-        return Response(serializer.data)
+        values = product_list_values(request, self.get_serializer_context())
+        products = self.queryset.filter(is_featured=True).values(*values.get_columns())[:8]
+        return Response(values.serialize(products))
 
     @action(detail=False, methods=['get'])
+    @cache_response()
     def on_sale(self, request):
         """Get products on sale"""
-        products = self.queryset.filter(sale_price__isnull=False)[:12]
-        serializer = ProductListSerializer(
-            products,
-            many=True,
-            context={'request': request}
-        )
-        return Response(serializer.data)
+        values = product_list_values(request, self.get_serializer_context())
+        products = self.queryset.filter(on_sale=True).values(*values.get_columns())[:12]
+        return Response(values.serialize(products))
 
     @action(detail=True, methods=['get'])
+    @cache_response()
     def related(self, request, slug=None):
-        """Get related products"""
+        """
+        Get related products
+
+        Co-purchased products first (see products.related), topped up from
+        the same category for items without enough order history.
+        """
         product = self.get_object()
-        related = Product.objects.filter(
-            category=product.category,
-            is_active=True
-        ).exclude(id=product.id)[:6]
-        
-        serializer = ProductListSerializer(
-            related,
-            many=True,
-            context={'request': request}
+        values = product_list_values(request, self.get_serializer_context())
+        columns = values.get_columns('id')
+        related = list(
+            Product.objects.filter(related_to__product=product, is_active=True)
+            .order_by('related_to__rank')
+            .values(*columns)[:RELATED_PRODUCTS_LIMIT]
         )
-        return Response(serializer.data)
+        missing = RELATED_PRODUCTS_LIMIT - len(related)
+        if missing:
+            related += Product.objects.filter(
+                category=product.category,
+                is_active=True
+            ).exclude(
+                id__in=[product.id, *(row['id'] for row in related)]
+            ).values(*columns)[:missing]
+
+        return Response(values.serialize(related))
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def review(self, request, slug=None):
@@ -164,3 +329,16 @@ class ProductReviewViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def suggest(request):
+    """Typeahead suggestions: top product and category name/slug pairs"""
+    try:
+        limit = int(request.query_params.get('limit', 8))
+    except ValueError:
+        limit = 8
+    limit = max(1, min(limit, 20))
+
+    return Response(suggest_names(request.query_params.get('q', ''), limit))
@@ -121,7 +121,7 @@ export const api = {
 
   // Orders
   orders: {
-    getAll: () => client.get('/orders/orders/'),
+    getAll: (pageUrl?: string) => client.get(pageUrl || '/orders/orders/'),
     getById: (id: number) => client.get(`/orders/orders/${id}/`),
     create: (data: any) => client.post('/orders/orders/', data),
   },
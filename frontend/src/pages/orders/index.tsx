@@ -4,7 +4,7 @@ import Link from 'next/link';
 import { FiPackage, FiClock, FiCheckCircle, FiXCircle, FiTruck, FiHome } from 'react-icons/fi';
 import { api } from '@/lib/api-client';
 import { useAuthStore } from '@/store';
-import { Order, OrderStatus } from '@/types';
+import { CursorPaginatedResponse, OrderStatus, OrderSummary } from '@/types';
 import { formatPrice } from '@/lib/utils';
 
 const statusConfig: Record<OrderStatus, { label: string; icon: any; color: string; bg: string }> =
@@ -50,7 +50,8 @@ const statusConfig: Record<OrderStatus, { label: string; icon: any; color: strin
 export default function Orders() {
   const router = useRouter();
   const { isAuthenticated } = useAuthStore();
-  const [orders, setOrders] = useState<Order[]>([]);
+  const [orders, setOrders] = useState<OrderSummary[]>([]);
+  const [nextPage, setNextPage] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
@@ -61,13 +62,15 @@ export default function Orders() {
     loadOrders();
   }, [isAuthenticated]);
 
-  const loadOrders = async () => {
+  const loadOrders = async (pageUrl?: string) => {
     try {
-      const response = await api.orders.getAll();
-      setOrders(Array.isArray(response.data) ? response.data : []);
+      const response = await api.orders.getAll(pageUrl);
+      const page: CursorPaginatedResponse<OrderSummary> = response.data;
+      setOrders((current) => (pageUrl ? [...current, ...page.results] : page.results));
+      setNextPage(page.next);
     } catch (error) {
       console.error('Error loading orders:', error);
-      setOrders([]);
+      if (!pageUrl) setOrders([]);
     } finally {
       setLoading(false);
     }
@@ -151,40 +154,13 @@ export default function Orders() {
 
                   {/* Order Items */}
                   <div className="p-6">
-                    <div className="space-y-3 mb-4">
-                      {order.items.map((item) => (
-                        <div
-                          key={item.id}
-                          className="flex items-center justify-between py-3 border-b border-gray-100 last:border-0"
-                        >
-                          <div className="flex-1">
-                            <h4 className="font-medium text-gray-900">{item.product_name}</h4>
-                            <p className="text-sm text-gray-600 mt-1">
-                              کد کالا: {item.product_sku}
-                            </p>
-                          </div>
-                          <div className="text-left ml-4">
-                            <p className="text-gray-700">
-                              {item.quantity} × {formatPrice(item.unit_price)}
-                            </p>
-                            <p className="font-bold text-gray-900 mt-1">
-                              {formatPrice(item.subtotal)}
-                            </p>
-                          </div>
-                        </div>
-                      ))}
-                    </div>
-
-                    {/* Shipping Info */}
-                    <div className="bg-gray-50 rounded-lg p-4 mb-4">
-                      <h4 className="font-bold text-gray-900 mb-2">آدرس تحویل</h4>
-                      <p className="text-gray-700 text-sm">
-                        {order.shipping_name} - {order.shipping_phone}
-                      </p>
-                      <p className="text-gray-600 text-sm mt-1">
-                        {order.shipping_address}, {order.shipping_city}, {order.shipping_state}
-                      </p>
-                      <p className="text-gray-600 text-sm">کد پستی: {order.shipping_postal_code}</p>
+                    <div className="flex items-center justify-between py-3 mb-4 border-b border-gray-100">
+                      <h4 className="font-medium text-gray-900">{order.first_item_name}</h4>
+                      {order.items_count > 1 && (
+                        <p className="text-sm text-gray-600">
+                          و {order.items_count - 1} کالای دیگر
+                        </p>
+                      )}
                     </div>
 
                     {/* Tracking Info */}
@@ -235,6 +211,15 @@ export default function Orders() {
                 </div>
               );
             })}
+
+            {nextPage && (
+              <button
+                onClick={() => loadOrders(nextPage)}
+                className="w-full px-4 py-3 bg-white text-primary border border-gray-200 rounded-lg hover:bg-gray-50 transition-colors"
+              >
+                نمایش سفارش‌های قدیمی‌تر
+              </button>
+            )}
           </div>
         )}
       </div>
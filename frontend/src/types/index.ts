@@ -147,6 +147,19 @@ export interface Order {
   items: OrderItem[];
 }
 
+// Order history row (slim list representation)
+export interface OrderSummary {
+  id: number;
+  order_number: string;
+  status: OrderStatus;
+  total: string;
+  is_paid: boolean;
+  items_count: number;
+  first_item_name: string | null;
+  tracking_number?: string | null;
+  created_at: string;
+}
+
 export interface OrderItem {
   id: number;
   product: number;
@@ -213,6 +226,13 @@ export interface PaginatedResponse<T> {
   results: T[];
 }
 
+export interface CursorPaginatedResponse<T> {
+  next: string | null;
+  previous: string | null;
+  estimated_count: number | null;
+  results: T[];
+}
+
 // Form Types
 export interface LoginForm {
   username: string;